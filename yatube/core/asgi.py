@@ -0,0 +1,158 @@
+"""ASGI adapter for the WSGI application.
+
+Django 2.2 has neither an ASGI handler nor async views, so the adapter
+runs each request through the WSGI application on a bounded thread
+pool while the event loop keeps accepting connections. A request
+waiting on a slow query or an image ties up one thread, not the
+worker. A request and its response body run on the same thread, so
+Django's thread-local database connections are opened and closed by
+the thread that used them.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Request bodies larger than this are spooled to disk.
+MAX_MEMORY_BODY = 1024 ** 2
+
+
+class Disconnected(Exception):
+    pass
+
+
+def _environ(scope, body):
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1')
+        # X_Forwarded_For would pass for X-Forwarded-For; drop it, as
+        # runserver and gunicorn do.
+        if '_' in name:
+            continue
+        name = name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
+
+
+class WsgiToAsgi:
+    """ASGI 3 application serving ``application`` from ``max_workers``
+    threads.
+    """
+
+    def __init__(self, application, max_workers=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope {scope["type"]!r}.')
+        try:
+            body = await self._body(receive)
+        except Disconnected:
+            return
+        loop = asyncio.get_running_loop()
+        with body:
+            await loop.run_in_executor(
+                self.executor, self._respond, loop, scope, body, send
+            )
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _body(self, receive):
+        body = tempfile.SpooledTemporaryFile(MAX_MEMORY_BODY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                raise Disconnected
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def _respond(self, loop, scope, body, send):
+        """Run the request on this thread, passing messages back to the
+        event loop one at a time.
+        """
+        def send_now(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+            return write
+
+        def write(chunk):
+            if not started.get('sent'):
+                send_now({
+                    'type': 'http.response.start',
+                    'status': started['status'],
+                    'headers': started['headers'],
+                })
+                started['sent'] = True
+            if chunk:
+                send_now({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+
+        result = self.application(_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            write(b'')
+        finally:
+            # Fires request_finished, which closes the connections of
+            # this thread.
+            if hasattr(result, 'close'):
+                result.close()
+        send_now({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,247 @@
+"""Two-tier cache backend.
+
+A small bounded LRU lives in every worker process in front of a shared
+backend (file based by default, so a single box needs no cache server).
+Most keys are written once: card and page keys embed version stamps, so
+they are new keys every time. Only overwrites, increments and deletes
+of keys already in the shared tier are published, to a journal of
+numbered entries there; workers read it at most once per
+``CHECK_INTERVAL`` seconds and drop just the keys it names. A worker
+that fell behind the journal, or finds it cleared, drops its whole
+local tier. Local entries also expire after ``LOCAL_TIMEOUT`` seconds,
+which bounds staleness when two workers race on a key.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+SEQUENCE_KEY = 'core:cache:journal'
+# Entries a worker may be behind before it drops its whole local tier.
+JOURNAL_LENGTH = 1000
+JOURNAL_TIMEOUT = 60
+MISSING = object()
+
+LOOKUPS = metrics.Counter(
+    'yatube_cache_lookups_total',
+    'Cache reads by tier and result; hit ratio is hits over all.',
+    labels=('tier', 'result'),
+)
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = dict(params.get('OPTIONS', {}))
+        shared_backend = options.pop(
+            'SHARED_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        )
+        self.local_max_entries = int(options.pop('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = float(options.pop('LOCAL_TIMEOUT', 5))
+        self.check_interval = float(options.pop('CHECK_INTERVAL', 1))
+        self.shared = import_string(shared_backend)(
+            location, dict(params, OPTIONS=options)
+        )
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._sequence = MISSING
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _journal_key(sequence):
+        return f'{SEQUENCE_KEY}:{sequence}'
+
+    def _sync(self):
+        """Drop the local entries other workers overwrote or deleted."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        sequence = self._start_journal()
+        seen = self._sequence
+        stale = None
+        if sequence == seen:
+            stale = []
+        elif seen is not MISSING and None not in (sequence, seen):
+            behind = sequence - seen
+            if 0 < behind <= JOURNAL_LENGTH:
+                entries = self.shared.get_many([
+                    self._journal_key(number)
+                    for number in range(seen + 1, sequence + 1)
+                ])
+                if len(entries) == behind:
+                    stale = [
+                        key for keys in entries.values() for key in keys
+                    ]
+        with self._lock:
+            if stale is None:
+                self._local.clear()
+            else:
+                for key in stale:
+                    self._local.pop(key, None)
+            self._sequence = sequence
+            self._checked_at = now
+
+    def _start_journal(self):
+        """The journal's last entry number, starting it if need be."""
+        sequence = self.shared.get(SEQUENCE_KEY)
+        if sequence is None:
+            # A journal restarted after a clear starts far from the old
+            # one, so workers that saw the old one drop everything.
+            self.shared.add(SEQUENCE_KEY, time.time_ns() // 1000, None)
+            sequence = self.shared.get(SEQUENCE_KEY)
+        return sequence
+
+    def _publish(self, local_keys):
+        """Tell other workers to drop ``local_keys``."""
+        if not local_keys:
+            return
+        self._start_journal()
+        try:
+            sequence = self.shared.incr(SEQUENCE_KEY)
+        except ValueError:
+            return
+        self.shared.set(
+            self._journal_key(sequence), list(local_keys), JOURNAL_TIMEOUT
+        )
+
+    def _existing(self, keys, version):
+        return [
+            self.make_key(key, version)
+            for key in keys
+            if self.shared.has_key(key, version)
+        ]
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return MISSING
+            pickled, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return MISSING
+            self._local.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        ttl = self.local_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._local_delete(key)
+            return
+        entry = (
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            time.monotonic() + ttl,
+        )
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self.make_key(key, version)
+        value = self._local_get(local_key)
+        if value is not MISSING:
+            LOOKUPS.inc(tier='local', result='hit')
+            return value
+        LOOKUPS.inc(tier='local', result='miss')
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            LOOKUPS.inc(tier='shared', result='miss')
+            return default
+        LOOKUPS.inc(tier='shared', result='hit')
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._local_get(self.make_key(key, version))
+            if value is MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        LOOKUPS.inc(len(found), tier='local', result='hit')
+        if remote:
+            LOOKUPS.inc(len(remote), tier='local', result='miss')
+            fetched = self.shared.get_many(remote, version)
+            for key, value in fetched.items():
+                self._local_set(self.make_key(key, version), value)
+            found.update(fetched)
+            LOOKUPS.inc(len(fetched), tier='shared', result='hit')
+            LOOKUPS.inc(
+                len(remote) - len(fetched), tier='shared', result='miss'
+            )
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._local_set(self.make_key(key, version), value, timeout)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        overwritten = self._existing([key], version)
+        self.shared.set(key, value, timeout, version)
+        self._local_set(self.make_key(key, version), value, timeout)
+        self._publish(overwritten)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        overwritten = self._existing(data, version)
+        failed = self.shared.set_many(data, timeout, version) or []
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(self.make_key(key, version), value, timeout)
+        self._publish(overwritten)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        self._local_delete(self.make_key(key, version))
+        self._publish([self.make_key(key, version)])
+        return value
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version)
+        self._local_delete(self.make_key(key, version))
+        self._publish([self.make_key(key, version)])
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self.make_key(key, version) for key in keys]
+        self.shared.delete_many(keys, version)
+        self._local_delete(*local_keys)
+        self._publish(local_keys)
+
+    def clear(self):
+        # Takes the journal with it: other workers drop everything.
+        self.shared.clear()
+        with self._lock:
+            self._local.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
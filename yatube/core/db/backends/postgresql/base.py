@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from core.db.reuse import ReusableConnectionMixin
+
+
+class DatabaseWrapper(ReusableConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from core.db.reuse import ReusableConnectionMixin
+
+
+class DatabaseWrapper(ReusableConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,115 @@
+"""Bounded in-process pool of database connections.
+
+Threads of one worker process share at most ``SIZE`` open connections
+per database. A thread that finds them all busy waits up to ``TIMEOUT``
+seconds, then gets an ``OperationalError``. The waits, the timeouts and
+the pool occupancy are exported as metrics.
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from core import metrics
+
+WAIT = metrics.Histogram(
+    'yatube_db_pool_wait_seconds',
+    'Time spent waiting for a pooled connection, by database.',
+    labels=('alias',),
+)
+TIMEOUTS = metrics.Counter(
+    'yatube_db_pool_timeouts_total',
+    'Requests for a pooled connection that gave up waiting.',
+    labels=('alias',),
+)
+CONNECTIONS = metrics.Gauge(
+    'yatube_db_pool_connections',
+    'Open pooled connections, by database and state.',
+    labels=('alias', 'state'),
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class Pool:
+    def __init__(self, alias, size, timeout):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, connect):
+        """``(connection, reused)``; ``connect()`` opens a new one while
+        the pool is below its size.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    TIMEOUTS.inc(alias=self.alias)
+                    raise PoolTimeout(
+                        f'No connection to {self.alias!r} was free '
+                        f'within {self.timeout} s.'
+                    )
+                self._condition.wait(remaining)
+            WAIT.observe(time.perf_counter() - started, alias=self.alias)
+            if self._idle:
+                return self._idle.pop(), True
+            self._open += 1
+        try:
+            return connect(), False
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, connection):
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Close a connection that must not be handed out again."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._forget()
+
+    def _forget(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            idle = len(self._idle)
+            return {'idle': idle, 'in_use': self._open - idle}
+
+
+def get(alias, size, timeout):
+    """The pool of ``alias`` in this process."""
+    key = (alias, os.getpid())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = Pool(alias, size, timeout)
+        return _pools[key]
+
+
+def _collect():
+    pid = os.getpid()
+    for (alias, owner), pool in list(_pools.items()):
+        if owner == pid:
+            for state, count in pool.stats().items():
+                CONNECTIONS.set(count, alias=alias, state=state)
+
+
+metrics.register_collector(_collect)
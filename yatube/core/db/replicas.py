@@ -0,0 +1,105 @@
+"""Routing of read-only views to database replicas.
+
+Views wrapped in ``replica_reads`` read from one of
+``DATABASE_REPLICAS``; everything else, every write and every read in
+a transaction stays on the primary. A request that writes pins its
+visitor to the primary for ``REPLICA_PIN_SECONDS`` through a cookie set
+by ReplicaPinningMiddleware, so the page a form redirects to shows what
+was just written even while replicas lag behind.
+
+Rows read from a replica may be older than the version stamps a write
+already moved, so they must not fill the stamped caches: cache fills
+either render inside ``primary_reads`` or check ``read_replica``.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary'
+
+_state = threading.local()
+
+
+def _get(name):
+    return getattr(_state, name, False)
+
+
+def replica_reads(view):
+    """Let the view's queries go to a replica."""
+    @wraps(view)
+    def routed(request, *args, **kwargs):
+        reading = _get('reading')
+        _state.reading = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.reading = reading
+
+    return routed
+
+
+@contextmanager
+def primary_reads():
+    """Keep the reads of the block on the primary."""
+    reading = _get('reading')
+    _state.reading = False
+    try:
+        yield
+    finally:
+        _state.reading = reading
+
+
+def is_replica(alias):
+    return alias in settings.DATABASE_REPLICAS
+
+
+def read_replica():
+    """Whether the current request has read anything from a replica."""
+    return _get('replicated')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not _get('reading')
+            or _get('pinned')
+            or _get('wrote')
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return None
+        _state.replicated = True
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Later reads of this request and of the next ones see the write.
+        _state.wrote = True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Keep visitors who just wrote on the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = PIN_COOKIE in request.COOKIES
+        _state.wrote = _state.replicated = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.pinned = _state.wrote = _state.replicated = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,109 @@
+"""Connection reuse for the database backends in core.db.backends.
+
+``CONN_HEALTH_CHECKS`` (as in later Django releases) pings a reused
+persistent connection before its first query in a request and reopens
+it if the database went away. ``POOL`` with a ``SIZE`` above zero
+shares connections between the threads of a process through
+core.db.pool; a pooled connection goes back to the pool at the end of
+every request, so ``CONN_MAX_AGE`` does not apply to it. Time spent
+opening connections is reported to the request profile and to metrics.
+"""
+import time
+
+from core import metrics, profiling
+
+from . import pool as pools
+
+CONNECT_DURATION = metrics.Histogram(
+    'yatube_db_connect_seconds',
+    'Time spent opening new database connections, by database.',
+    labels=('alias',),
+)
+
+
+class ReusableConnectionMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        # An in-memory SQLite database never lets its connection go.
+        in_memory = getattr(self, 'is_in_memory_db', lambda: False)()
+        if not options.get('SIZE') or in_memory:
+            return None
+        return pools.get(
+            self.alias, options['SIZE'], options.get('TIMEOUT', 5)
+        )
+
+    def connect(self):
+        with profiling.timed('connect'):
+            super().connect()
+        self.health_check_done = True
+        if self.pool is not None:
+            # Back to the pool when the request ends.
+            self.close_at = time.time()
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return self._open(conn_params)
+        while True:
+            connection, reused = pool.acquire(
+                lambda: self._open(conn_params)
+            )
+            if not reused or self._healthy(connection):
+                return connection
+            pool.discard(connection)
+
+    def _open(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        CONNECT_DURATION.observe(
+            time.perf_counter() - started, alias=self.alias
+        )
+        return connection
+
+    def _healthy(self, connection):
+        if not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return True
+        try:
+            connection.cursor().execute('SELECT 1')
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        if self.in_atomic_block or (
+            self.errors_occurred and not self.is_usable()
+        ):
+            # The wrapper keeps a connection closed inside a transaction.
+            pool.discard(connection)
+            return
+        try:
+            connection.rollback()
+        except self.Database.Error:
+            pool.discard(connection)
+        else:
+            pool.release(connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
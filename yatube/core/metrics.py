@@ -0,0 +1,325 @@
+"""Prometheus metrics without a client library.
+
+Counters, gauges and histograms live in a per-process registry. With
+``METRICS_DIR`` set, every process writes its registry to
+``<METRICS_DIR>/<pid>.json`` at most once per ``FLUSH_INTERVAL`` seconds,
+and ``/metrics`` merges all files: counters and histograms are summed
+over every process that ever ran, gauges only over live processes.
+Exited processes fold their counters into ``archive.json`` and remove
+their file, on exit or, if they died, at the next scrape; a process
+starting under a reused pid archives the file it finds first.
+Without it, ``/metrics`` shows the serving process alone.
+"""
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 1.0
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = tuple(2 ** power for power in range(10, 26, 2))
+ARCHIVE = 'archive.json'
+
+_families = {}
+_collectors = []
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.flushed_at = 0.0
+        # The file this process has made its own.
+        self.claimed = None
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's counts again.
+        if self.pid != os.getpid():
+            self._reset()
+
+    def add(self, sample, labels, amount):
+        with self._lock:
+            self._check_fork()
+            self.counters[(sample, labels)] += amount
+
+    def set(self, sample, labels, value):
+        with self._lock:
+            self._check_fork()
+            self.gauges[(sample, labels)] = value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [
+                    [sample, list(labels), value]
+                    for (sample, labels), value in self.counters.items()
+                ],
+                'gauges': [
+                    [sample, list(labels), value]
+                    for (sample, labels), value in self.gauges.items()
+                ],
+            }
+
+
+registry = Registry()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        _families[name] = self
+
+    def _labels(self, values, **extra):
+        pairs = [(label, str(values[label])) for label in self.labels]
+        pairs.extend((label, value) for label, value in extra.items())
+        return tuple(pairs)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, self._labels(labels), amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        registry.set(self.name, self._labels(labels), value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        for bound in self.buckets:
+            # Every bucket is written, even empty, so series stay complete.
+            registry.add(
+                f'{self.name}_bucket',
+                self._labels(labels, le=_format(bound)),
+                1 if value <= bound else 0,
+            )
+        registry.add(f'{self.name}_sum', self._labels(labels), value)
+        registry.add(f'{self.name}_count', self._labels(labels), 1)
+
+
+def register_collector(collect):
+    """Call ``collect()`` before every flush, e.g. to set gauges."""
+    _collectors.append(collect)
+
+
+def _collect():
+    for collect in _collectors:
+        collect()
+
+
+def _path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{pid}.json')
+
+
+@contextmanager
+def _locked():
+    """Hold the lock of ``METRICS_DIR`` while files are retired."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, 'lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as snapshot:
+        json.dump(data, snapshot)
+    os.replace(temporary, path)
+
+
+def _retire(paths):
+    """Fold the counters of ``paths`` into the archive and remove them.
+    Callers hold the lock.
+    """
+    archive = os.path.join(settings.METRICS_DIR, ARCHIVE)
+    totals = defaultdict(float)
+    for path in [archive, *paths]:
+        data = _read(path) or {'counters': []}
+        for sample, labels, value in data['counters']:
+            totals[(sample, tuple(map(tuple, labels)))] += value
+    _write(archive, {
+        'counters': [
+            [sample, [list(pair) for pair in labels], value]
+            for (sample, labels), value in totals.items()
+        ],
+        'gauges': [],
+    })
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def flush(force=False):
+    """Write this process's registry to ``METRICS_DIR``."""
+    if not settings.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - registry.flushed_at < FLUSH_INTERVAL:
+        return
+    registry.flushed_at = now
+    _collect()
+    snapshot = registry.snapshot()
+    path = _path(os.getpid())
+    if registry.claimed != path:
+        # A file under this pid was left by an earlier process.
+        with _locked():
+            if os.path.exists(path):
+                _retire([path])
+        registry.claimed = path
+    _write(path, snapshot)
+
+
+def _exit():
+    if not settings.METRICS_DIR:
+        return
+    flush(force=True)
+    with _locked():
+        _retire([_path(os.getpid())])
+
+
+atexit.register(_exit)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _snapshots():
+    """``(alive, data)`` of every process, the archive counting as
+    dead.
+    """
+    if not settings.METRICS_DIR:
+        _collect()
+        return [(True, registry.snapshot())]
+    flush(force=True)
+    live, dead = [], []
+    with _locked():
+        for name in os.listdir(settings.METRICS_DIR):
+            pid, extension = os.path.splitext(name)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            path = os.path.join(settings.METRICS_DIR, name)
+            (live if _alive(int(pid)) else dead).append(path)
+        if dead:
+            _retire(dead)
+        snapshots = [
+            (path in live, _read(path))
+            for path in [os.path.join(settings.METRICS_DIR, ARCHIVE), *live]
+        ]
+    return [(alive, data) for alive, data in snapshots if data is not None]
+
+
+def merged():
+    """``{(sample, labels): value}`` over every process."""
+    values = defaultdict(float)
+    for alive, data in _snapshots():
+        kinds = ('counters', 'gauges') if alive else ('counters',)
+        for kind in kinds:
+            for sample, labels, value in data[kind]:
+                key = (sample, tuple(tuple(pair) for pair in labels))
+                values[key] += value
+    return values
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def _family(sample):
+    for suffix in ('_bucket', '_sum', '_count'):
+        name = sample[:-len(suffix)]
+        if sample.endswith(suffix) and name in _families:
+            return name
+    return sample
+
+
+def _sort_key(item):
+    (sample, labels), _ = item
+    return sample, [
+        (label, float(text) if label == 'le' else text)
+        for label, text in labels
+    ]
+
+
+def exposition():
+    """The merged metrics in the Prometheus text format."""
+    by_family = defaultdict(list)
+    for key, value in merged().items():
+        by_family[_family(key[0])].append((key, value))
+
+    lines = []
+    for name in sorted(by_family):
+        family = _families.get(name)
+        if family is not None:
+            lines.append(f'# HELP {name} {family.documentation}')
+            lines.append(f'# TYPE {name} {family.kind}')
+        for (sample, labels), value in sorted(
+            by_family[name], key=_sort_key
+        ):
+            rendered = ','.join(
+                f'{label}="{_escape(text)}"' for label, text in labels
+            )
+            if rendered:
+                sample = f'{sample}{{{rendered}}}'
+            lines.append(f'{sample} {_format(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,112 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, profiling
+
+# Routes outside these namespaces share one label to bound cardinality.
+METRIC_NAMESPACES = ('posts', 'users', 'about')
+
+REQUEST_DURATION = metrics.Histogram(
+    'yatube_http_request_duration_seconds',
+    'Time spent answering requests, by route.',
+    labels=('route', 'method'),
+)
+REQUESTS = metrics.Counter(
+    'yatube_http_requests_total',
+    'Answered requests, by route and status.',
+    labels=('route', 'method', 'status'),
+)
+QUERIES = metrics.Counter(
+    'yatube_db_queries_total',
+    'SQL statements run while answering requests, by route.',
+    labels=('route',),
+)
+UPLOAD_SIZE = metrics.Histogram(
+    'yatube_upload_size_bytes',
+    'Sizes of uploaded files.',
+    buckets=metrics.SIZE_BUCKETS,
+)
+
+
+class ProfilingMiddleware:
+    """Profile ``PROFILING_SAMPLE_RATE`` of requests, 0 turns it off.
+
+    Sampled responses carry a ``Server-Timing`` header and feed the
+    rolling aggregate shown at ``/_perf/``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        profiling.install()
+
+    def __call__(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = profiling.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            profiling.stop()
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        profiling.record(view, profile)
+        response['Server-Timing'] = profile.server_timing()
+        return response
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and SQL statements per route."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        route = self.route(request)
+        REQUEST_DURATION.observe(
+            duration, route=route, method=request.method
+        )
+        REQUESTS.inc(
+            route=route, method=request.method, status=response.status_code
+        )
+        QUERIES.inc(queries, route=route)
+        # Only look at uploads the view already parsed.
+        if '_files' in request.__dict__:
+            for upload in request.FILES.values():
+                UPLOAD_SIZE.observe(upload.size)
+        metrics.flush()
+        return response
+
+    @staticmethod
+    def route(request):
+        match = request.resolver_match
+        if match is None:
+            return 'unresolved'
+        if match.namespace in METRIC_NAMESPACES:
+            return match.view_name
+        return 'other'
@@ -0,0 +1,164 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Keys of a cursor must fit a 64-bit integer column.
+MIN_KEY = -2 ** 63
+MAX_KEY = 2 ** 63 - 1
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator over a queryset ordered by ``(field, pk)``.
+
+    Pages are addressed by opaque cursor tokens instead of numbers,
+    so fetching any page is a single range scan on ``(field, pk)``
+    with ``LIMIT per_page + 1`` and no ``COUNT(*)`` or ``OFFSET``.
+    The ordering field must be a ``DateTimeField``; ties are broken by
+    ``key``, the primary key unless the rows stand for other objects.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 descending=True, key='pk', **kwargs):
+        self.field = field
+        self.descending = descending
+        self.key = key
+        super().__init__(
+            object_list.order_by(*self._ordering(descending)),
+            per_page,
+            **kwargs
+        )
+
+    def _ordering(self, descending):
+        prefix = '-' if descending else ''
+        return (f'{prefix}{self.field}', f'{prefix}{self.key}')
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.field).isoformat()
+        raw = f'{direction}|{value}|{getattr(obj, self.key)}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(direction, value, pk)`` or None for a bad token."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, value, pk = raw.decode().split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+            if value is not None:
+                # Dates a database cannot store overflow once in UTC.
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                value = value.astimezone(timezone.utc)
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                OverflowError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or value is None:
+            return None
+        if not MIN_KEY <= pk <= MAX_KEY:
+            return None
+        return direction, value, pk
+
+    def _after(self, value, pk, forward):
+        """Filter for rows strictly after ``(value, pk)`` in scan order."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'{self.key}__{lookup}': pk})
+        )
+
+    def get_page(self, cursor=None):
+        """Return the page that ``cursor`` points at.
+
+        A missing or malformed cursor yields the first page, mirroring
+        how ``Paginator.get_page`` treats bad page numbers.
+        """
+        position = self.decode_cursor(cursor)
+        if position is None:
+            rows = list(self.object_list[:self.per_page + 1])
+            return self._cursor_page(
+                rows[:self.per_page], '',
+                has_previous=False,
+                has_next=len(rows) > self.per_page,
+            )
+
+        direction, value, pk = position
+        if direction == NEXT:
+            rows = list(
+                self.object_list.filter(self._after(value, pk, True))
+                [:self.per_page + 1]
+            )
+            return self._cursor_page(
+                rows[:self.per_page], cursor,
+                has_previous=True,
+                has_next=len(rows) > self.per_page,
+            )
+
+        rows = list(
+            self.object_list
+            .filter(self._after(value, pk, False))
+            .order_by(*self._ordering(not self.descending))
+            [:self.per_page + 1]
+        )
+        if len(rows) <= self.per_page:
+            # Walked back to the head of the feed: serve a full first page.
+            return self.get_page()
+        return self._cursor_page(
+            rows[:self.per_page][::-1], cursor,
+            has_previous=True,
+            has_next=True,
+        )
+
+    def get_numbered_page(self, number):
+        """Legacy ``?page=N`` access through ``COUNT`` and ``OFFSET``.
+
+        Kept so old links keep working; the returned page still carries
+        cursors, so navigation continues in keyset mode.
+        """
+        page = super().get_page(number)
+        rows = list(page.object_list)
+        page.object_list = rows
+        page.cursor = ''
+        page.previous_cursor = (
+            self.encode_cursor(rows[0], PREVIOUS)
+            if rows and page.has_previous() else ''
+        )
+        page.next_cursor = (
+            self.encode_cursor(rows[-1], NEXT)
+            if rows and page.has_next() else ''
+        )
+        return page
+
+    def _cursor_page(self, rows, cursor, has_previous, has_next):
+        page = self._get_page(rows, 1, self)
+        page.cursor = cursor or ''
+        page.previous_cursor = (
+            self.encode_cursor(rows[0], PREVIOUS)
+            if rows and has_previous else ''
+        )
+        page.next_cursor = (
+            self.encode_cursor(rows[-1], NEXT)
+            if rows and has_next else ''
+        )
+        return page
+
+
+def paginate(request, queryset, per_page, **kwargs):
+    """Return the requested page of ``queryset``.
+
+    ``?cursor=`` selects a keyset page, a bare ``?page=N`` falls back
+    to numbered access for old links.
+    """
+    paginator = CursorPaginator(queryset, per_page, **kwargs)
+    cursor = request.GET.get('cursor')
+    page_number = request.GET.get('page')
+    if not cursor and page_number:
+        return paginator.get_numbered_page(page_number)
+    return paginator.get_page(cursor)
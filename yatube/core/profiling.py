@@ -0,0 +1,192 @@
+"""Sampled per-request profiling.
+
+ProfilingMiddleware starts a ``Profile`` for a sampled share of
+requests. While it is active, SQL statements, template renders and
+blocks wrapped in ``timed()``, such as opening database connections,
+add their time to it. Finished profiles are
+reported in the ``Server-Timing`` header and kept in a bounded rolling
+window per view, which the ``/_perf/`` page summarises.
+"""
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from django.template import base as template_base
+
+WINDOW = 500
+# Repeats of one statement in a request that count as an N+1 pattern.
+N_PLUS_ONE = 3
+SIGNATURES = 20
+
+_local = threading.local()
+_lock = threading.Lock()
+_windows = defaultdict(lambda: deque(maxlen=WINDOW))
+_signatures = defaultdict(Counter)
+_installed = False
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = Counter()
+        self.queries = 0
+        self.statements = Counter()
+        self.calls = Counter()
+        self._template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` hook."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db'] += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+            self.calls[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        """Statements re-run with the very same parameters."""
+        return sum(count - 1 for count in self.calls.values() if count > 1)
+
+    @property
+    def repeated(self):
+        """Statements run ``N_PLUS_ONE`` times or more: N+1 suspects."""
+        return {
+            sql: count for sql, count in self.statements.items()
+            if count >= N_PLUS_ONE
+        }
+
+    def finish(self):
+        self.timings['total'] = time.perf_counter() - self.started
+        return self
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={self.timings["db"] * 1000:.1f};'
+            f'desc="{self.queries} queries, {self.duplicates} duplicate"',
+        ]
+        for name in ('connect', 'template', 'thumbnail', 'total'):
+            parts.append(f'{name};dur={self.timings[name] * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    """The profile of the request on this thread, if it is sampled."""
+    return getattr(_local, 'profile', None)
+
+
+def start():
+    _local.profile = Profile()
+    return _local.profile
+
+
+def stop():
+    profile = current()
+    _local.profile = None
+    return profile.finish() if profile is not None else None
+
+
+@contextmanager
+def timed(name):
+    """Add the block's duration to timing ``name`` of the current profile.
+    """
+    profile = current()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] += time.perf_counter() - started
+
+
+def install():
+    """Time template renders; nested includes count once."""
+    global _installed
+    if _installed:
+        return
+    render = template_base.Template.render
+
+    def profiled_render(self, context):
+        profile = current()
+        if profile is None or profile._template_depth:
+            return render(self, context)
+        profile._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile._template_depth -= 1
+            profile.timings['template'] += time.perf_counter() - started
+
+    template_base.Template.render = profiled_render
+    _installed = True
+
+
+def record(view, profile):
+    with _lock:
+        _windows[view].append((
+            profile.timings['total'],
+            profile.timings['db'],
+            profile.timings['template'],
+            profile.timings['thumbnail'],
+            profile.timings['connect'],
+            profile.queries,
+            profile.duplicates,
+        ))
+        signatures = _signatures[view]
+        signatures.update(profile.repeated)
+        if len(signatures) > SIGNATURES * 5:
+            _signatures[view] = Counter(
+                dict(signatures.most_common(SIGNATURES))
+            )
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[max(int(len(ordered) * 0.95 + 0.5) - 1, 0)]
+
+
+def summary():
+    """Rolling per-view aggregate, times in milliseconds."""
+    with _lock:
+        windows = {view: list(samples) for view, samples in _windows.items()}
+        signatures = {
+            view: counter.most_common(SIGNATURES)
+            for view, counter in _signatures.items()
+        }
+    report = {}
+    for view, samples in sorted(windows.items()):
+        (total, db, template, thumbnail, connect, queries,
+         duplicates) = zip(*samples)
+        report[view] = {
+            'samples': len(samples),
+            'total_ms': round(_mean(total) * 1000, 2),
+            'total_p95_ms': round(_p95(total) * 1000, 2),
+            'db_ms': round(_mean(db) * 1000, 2),
+            'template_ms': round(_mean(template) * 1000, 2),
+            'thumbnail_ms': round(_mean(thumbnail) * 1000, 2),
+            'connect_ms': round(_mean(connect) * 1000, 2),
+            'queries': round(_mean(queries), 1),
+            'max_queries': max(queries),
+            'duplicates': round(_mean(duplicates), 1),
+            'n_plus_one': [
+                {'sql': sql, 'count': count}
+                for sql, count in signatures.get(view, [])
+            ],
+        }
+    return report
+
+
+def reset():
+    with _lock:
+        _windows.clear()
+        _signatures.clear()
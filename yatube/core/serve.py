@@ -0,0 +1,146 @@
+"""File responses for static and media files served by Django itself.
+
+Every response carries an ETag and Last-Modified and conditional
+requests get a 304. Single byte ranges are honoured, and a precompressed
+``.br`` or ``.gz`` sibling is sent to clients that accept it. Files whose
+name changes with their content are cached as immutable for a year;
+other files are revalidated on every use.
+"""
+import mimetypes
+import os
+import re
+from http import HTTPStatus
+
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class Unsatisfiable(Exception):
+    pass
+
+
+def _accepts(request, coding):
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        token, _, params = part.partition(';')
+        if token.strip().lower() == coding:
+            quality = params.replace(' ', '').lower()
+            return not re.fullmatch(r'q=0(\.0*)?', quality)
+    return False
+
+
+def _encoded(request, path):
+    """``(path, coding)`` of the variant to send."""
+    if 'HTTP_RANGE' not in request.META:
+        for coding, suffix in ENCODINGS:
+            if _accepts(request, coding) and os.path.isfile(path + suffix):
+                return path + suffix, coding
+    return path, None
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def byte_range(header, size):
+    """``(first, last)`` byte positions a single-range ``Range`` header
+    asks for, ``None`` to send the whole file.
+
+    Raises ``Unsatisfiable`` when the range lies past the end.
+    """
+    match = RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0:
+            raise Unsatisfiable
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise Unsatisfiable
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _not_modified(request, etag, stat):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    return not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime,
+        stat.st_size,
+    )
+
+
+def serve(request, path, immutable=False):
+    """Respond with the file at the absolute ``path``."""
+    content_type, _ = mimetypes.guess_type(path)
+    path, coding = _encoded(request, path)
+    stat = os.stat(path)
+    etag = _etag(stat)
+    headers = {
+        'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if _not_modified(request, etag, stat):
+        response = HttpResponseNotModified()
+    else:
+        response = _content(request, path, stat, etag)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if coding:
+            response['Content-Encoding'] = coding
+    for header, value in headers.items():
+        response[header] = value
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _content(request, path, stat, etag):
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or if_range == etag):
+        try:
+            requested = byte_range(header, stat.st_size)
+        except Unsatisfiable:
+            response = HttpResponse(
+                status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if requested is not None:
+            first, last = requested
+            response = StreamingHttpResponse(
+                _read(path, first, last - first + 1),
+                status=HTTPStatus.PARTIAL_CONTENT,
+            )
+            response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+            response['Content-Length'] = last - first + 1
+            return response
+    return FileResponse(open(path, 'rb'))
@@ -0,0 +1,29 @@
+"""Version stamps for cache invalidation.
+
+Cached values embed the stamps they were built from in their keys;
+bumping a stamp makes every such value unreachable at once. Stamps are
+time based rather than counters, so a stamp that was evicted and
+recreated never matches a key built before the eviction.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def new_stamp():
+    return time.time_ns()
+
+
+def get_stamps(keys):
+    """Fetch stamps with one ``get_many``, creating the missing ones."""
+    stamps = cache.get_many(keys)
+    missing = {key: new_stamp() for key in keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    return stamps
+
+
+def bump(*keys):
+    stamp = new_stamp()
+    cache.set_many({key: stamp for key in keys}, None)
@@ -0,0 +1,68 @@
+"""Fingerprinted, precompressed static files.
+
+collectstatic copies every file to a name holding a hash of its content,
+so it can be cached forever, and writes a ``.gz`` copy of the text
+files next to it; a ``.br`` one too when the brotli package is
+installed. core.serve hands out those copies to clients accepting them.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.ico', '.json')
+# Files this small gain nothing from compression.
+MIN_SIZE = 512
+
+
+def encoders():
+    """``{suffix: compress}`` of the precompressed variants to write."""
+    found = {'.gz': lambda data: gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        found['.br'] = brotli.compress
+    return found
+
+
+class ManifestStorage(ManifestStaticFilesStorage):
+    """Manifest storage that falls back to the plain name for files
+    missing from the manifest, as before collectstatic has run, instead
+    of failing the page.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, *args, **kwargs):
+        hashed = []
+        for name, hashed_name, processed in super().post_process(
+            *args, **kwargs
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.append(hashed_name)
+            yield name, hashed_name, processed
+        for name in hashed:
+            self.compress(name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1] not in COMPRESSIBLE:
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, encode in encoders().items():
+            compressed = encode(data)
+            if len(compressed) < len(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
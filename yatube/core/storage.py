@@ -0,0 +1,69 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Names ContentAddressedStorage gives: posts/ab/ab12….webp.
+CONTENT_NAME = re.compile(r'^(?:.+/)?([0-9a-f]{2})/\1[0-9a-f]{62}\.\w+$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after the SHA-256 of their
+    content: ``posts/photo.webp`` is saved as ``posts/ab/ab12….webp``.
+
+    Saving content that is already stored writes nothing and returns the
+    existing name, so identical uploads share one file. The storage does
+    not know who refers to a file: deleting is up to its users.
+    """
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self._save(self.content_name(name, content), content)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed into place: a concurrent save of the
+        # same content replaces the file with identical bytes.
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(descriptor)
+                file_move_safe(
+                    content.temporary_file_path(), temporary,
+                    allow_overwrite=True,
+                )
+            else:
+                with os.fdopen(descriptor, 'wb') as output:
+                    for chunk in content.chunks():
+                        output.write(chunk)
+            # mkstemp creates files readable by their owner only.
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
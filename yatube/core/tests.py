@@ -0,0 +1,561 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+from PIL import Image
+
+from . import blurhash, metrics, profiling
+from .asgi import WsgiToAsgi
+from .db import pool
+from .db.replicas import (
+    PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, replica_reads
+)
+from .db.backends.sqlite3.base import DatabaseWrapper
+from .serve import IMMUTABLE, REVALIDATE
+from .storage import ContentAddressedStorage
+from .cache import TieredCache
+
+User = get_user_model()
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def make_worker(self, **options):
+        options.setdefault('CHECK_INTERVAL', 0)
+        return TieredCache(self.location, {'OPTIONS': options})
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Repeated reads do not touch the shared tier."""
+        worker = self.make_worker(CHECK_INTERVAL=60)
+        worker.set('key', 'value')
+        worker.get('key')
+        shutil.rmtree(self.location)
+
+        self.assertEqual(worker.get('key'), 'value')
+
+    def test_writes_reach_other_workers(self):
+        """A write in one worker invalidates the other's local tier."""
+        first, second = self.make_worker(), self.make_worker()
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_new_keys_keep_other_workers_local_tiers(self):
+        """Only overwritten keys are dropped from other workers."""
+        first, second = self.make_worker(), self.make_worker()
+        first.set_many({'a': 1, 'b': 2})
+        second.get_many(['a', 'b'])
+
+        first.set('c', 3)
+        second.get('c')
+        self.assertEqual(
+            set(second._local),
+            {second.make_key(key) for key in 'abc'},
+        )
+
+        first.set('a', 10)
+        self.assertEqual(second.get('a'), 10)
+        self.assertIn(second.make_key('b'), second._local)
+
+    def test_clear_reaches_other_workers(self):
+        """A cleared journal makes other workers drop everything."""
+        first, second = self.make_worker(), self.make_worker()
+        first.set('key', 'old')
+        second.get('key')
+
+        first.clear()
+        first.set('key', 'new')
+
+        self.assertEqual(second.get('key'), 'new')
+
+    def test_local_tier_is_bounded(self):
+        """The local tier evicts least recently used entries."""
+        worker = self.make_worker(LOCAL_MAX_ENTRIES=2, CHECK_INTERVAL=60)
+        worker.set_many({'a': 1, 'b': 2})
+        worker.get('a')
+        worker.set('c', 3)
+
+        self.assertEqual(list(worker._local), [
+            worker.make_key('a'), worker.make_key('c')
+        ])
+        self.assertEqual(worker.get_many(['a', 'b', 'c']), {
+            'a': 1, 'b': 2, 'c': 3
+        })
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client = Client()
+
+    def test_sampled_response_has_server_timing(self):
+        """Sampled requests report db, template and total timings."""
+        response = self.client.get(reverse('posts:index'))
+
+        timing = response['Server-Timing']
+        for name in ('db;dur=', 'template;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+        self.assertIn('queries', timing)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_response_is_untouched(self):
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(profiling.summary(), {})
+
+    def test_perf_page_is_for_staff(self):
+        """/_perf/ summarises sampled views for staff only."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get('/_perf/').status_code, 302)
+
+        self.client.force_login(self.staff)
+        report = self.client.get('/_perf/').json()
+
+        self.assertEqual(report['posts:index']['samples'], 1)
+        self.assertIn('total_p95_ms', report['posts:index'])
+
+
+class ProfileTests(SimpleTestCase):
+    def test_repeated_statements_are_flagged(self):
+        """Same statement run per row is an N+1 suspect."""
+        profile = profiling.Profile()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for pk in range(profiling.N_PLUS_ONE):
+            profile.execute(execute, 'SELECT %s', (pk,), False, {})
+        profile.execute(execute, 'SELECT %s', (0,), False, {})
+
+        self.assertEqual(profile.queries, profiling.N_PLUS_ONE + 1)
+        self.assertEqual(profile.duplicates, 1)
+        self.assertEqual(profile.repeated, {
+            'SELECT %s': profiling.N_PLUS_ONE + 1
+        })
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_exposed_per_route(self):
+        """Routes, latency buckets, queries and cache reads are scraped."""
+        self.client.get(reverse('posts:index'))
+
+        text = self.scrape()
+
+        self.assertIn('# TYPE yatube_http_request_duration_seconds '
+                      'histogram', text)
+        self.assertIn('yatube_http_requests_total{route="posts:index",'
+                      'method="GET",status="200"}', text)
+        self.assertIn('yatube_http_request_duration_seconds_bucket{'
+                      'route="posts:index",method="GET",le="+Inf"}', text)
+        self.assertIn('yatube_db_queries_total{route="posts:index"}', text)
+        self.assertIn('yatube_cache_lookups_total{tier="local"', text)
+        self.assertIn('yatube_thumbnail_queue_depth 0', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_guards_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+
+    def test_worker_files_are_merged(self):
+        """Counters of exited workers stay, their gauges do not."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        with open(os.path.join(directory, f'{exited.pid}.json'), 'w') as f:
+            json.dump({
+                'counters': [['yatube_db_queries_total',
+                              [['route', 'posts:index']], 5]],
+                'gauges': [['yatube_thumbnail_queue_depth', [], 7]],
+            }, f)
+
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('posts:index'))
+            merged = metrics.merged()
+            merged_again = metrics.merged()
+
+        key = ('yatube_db_queries_total', (('route', 'posts:index'),))
+        own = metrics.registry.counters[key]
+        self.assertEqual(merged[key], own + 5)
+        self.assertEqual(merged_again[key], own + 5)
+        self.assertEqual(merged[('yatube_thumbnail_queue_depth', ())], 0)
+        # The exited worker was folded into the archive.
+        self.assertEqual(
+            set(os.listdir(directory)),
+            {'archive.json', 'lock', f'{os.getpid()}.json'},
+        )
+
+    def test_reused_pid_does_not_overwrite_counters(self):
+        """A file left under this process's pid is archived first."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with open(os.path.join(directory, f'{os.getpid()}.json'), 'w') as f:
+            json.dump({
+                'counters': [['yatube_db_queries_total',
+                              [['route', 'posts:index']], 5]],
+                'gauges': [],
+            }, f)
+
+        with override_settings(METRICS_DIR=directory):
+            merged = metrics.merged()
+
+        key = ('yatube_db_queries_total', (('route', 'posts:index'),))
+        self.assertEqual(merged[key], metrics.registry.counters[key] + 5)
+
+
+class BlurhashTests(SimpleTestCase):
+    def test_solid_image(self):
+        value = blurhash.encode(Image.new('RGB', (40, 20), (255, 0, 0)))
+
+        self.assertEqual(len(value), 28)
+        self.assertEqual(blurhash.average_color(value), '#ff0000')
+
+    def test_gradient_has_detail(self):
+        image = Image.linear_gradient('L').convert('RGB')
+
+        value = blurhash.encode(image)
+
+        self.assertNotEqual(value[1], '0')
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('posts/a.GIF', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^posts/([0-9a-f]{2})/\1[0-9a-f]{62}\.gif$')
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'same')
+
+
+class FileServingTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.static_root = os.path.join(root, 'static')
+        self.media_root = os.path.join(root, 'media')
+        os.makedirs(os.path.join(self.media_root, 'posts'))
+        settings = override_settings(
+            STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_fingerprinted_static_is_immutable_and_precompressed(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertNotEqual(url, '/static/css/bootstrap.min.css')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        with staticfiles_storage.open(url[len('/static/'):]) as original:
+            self.assertEqual(
+                gzip.decompress(b''.join(response.streaming_content)),
+                original.read(),
+            )
+
+    def test_media_ranges_and_revalidation(self):
+        with open(os.path.join(self.media_root, 'posts/a.gif'), 'wb') as f:
+            f.write(b'0123456789')
+
+        full = self.client.get('/media/posts/a.gif')
+        partial = self.client.get('/media/posts/a.gif', HTTP_RANGE='bytes=2-4')
+        suffix = self.client.get('/media/posts/a.gif', HTTP_RANGE='bytes=-3')
+        past_end = self.client.get(
+            '/media/posts/a.gif', HTTP_RANGE='bytes=10-'
+        )
+        cached = self.client.get(
+            '/media/posts/a.gif', HTTP_IF_NONE_MATCH=full['ETag']
+        )
+
+        self.assertEqual(full['Cache-Control'], REVALIDATE)
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), b'234')
+        self.assertEqual(partial['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(suffix.streaming_content), b'789')
+        self.assertEqual(past_end.status_code, 416)
+        self.assertEqual(cached.status_code, 304)
+
+    def test_missing_and_escaping_paths_are_not_found(self):
+        for path in ('/media/posts/missing.gif', '/media/../settings.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+
+def echo(environ, start_response):
+    """WSGI app answering with the request it got, after a pause."""
+    time.sleep(float(environ.get('HTTP_X_DELAY', 0)))
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    yield json.dumps({
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'],
+        'query': environ['QUERY_STRING'],
+        'type': environ.get('CONTENT_TYPE'),
+        'body': environ['wsgi.input'].read().decode(),
+    }).encode()
+
+
+class AsgiAdapterTests(SimpleTestCase):
+    def call(self, application, path='/', method='GET', body=b'',
+             headers=()):
+        """Run one request, returning ``(status, headers, body)``."""
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [(b'host', b'testserver'), *headers],
+        }
+        return application(scope, receive, send), sent
+
+    def run_one(self, application, *args, **kwargs):
+        coroutine, sent = self.call(application, *args, **kwargs)
+        asyncio.run(coroutine)
+        start = sent[0]
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        return start['status'], dict(start['headers']), body
+
+    def test_request_reaches_wsgi_application(self):
+        """Method, path, query, headers and body are passed through."""
+        status, headers, body = self.run_one(
+            WsgiToAsgi(echo, 1), '/путь/?a=1', 'POST', b'text',
+            [(b'content-type', b'text/plain')],
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(json.loads(body), {
+            'method': 'POST',
+            'path': '/путь/'.encode().decode('latin-1'),
+            'query': 'a=1',
+            'type': 'text/plain',
+            'body': 'text',
+        })
+
+    def test_headers_are_not_spoofed(self):
+        """Underscored names are dropped; cookies are joined by ``; ``.
+        """
+        environ = {}
+
+        def application(request_environ, start_response):
+            environ.update(request_environ)
+            start_response('204 No Content', [])
+            return []
+
+        self.run_one(WsgiToAsgi(application, 1), headers=[
+            (b'x-forwarded-for', b'10.0.0.1'),
+            (b'x_forwarded_for', b'10.6.6.6'),
+            (b'cookie', b'a=1'),
+            (b'cookie', b'b=2'),
+        ])
+
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '10.0.0.1')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+
+    def test_slow_requests_run_concurrently(self):
+        """Slow requests overlap instead of queueing on one thread."""
+        application = WsgiToAsgi(echo, 4)
+
+        async def fire():
+            await asyncio.gather(*(
+                self.call(application, headers=[(b'x-delay', b'0.2')])[0]
+                for _ in range(4)
+            ))
+
+        started = time.perf_counter()
+        asyncio.run(fire())
+
+        self.assertLess(time.perf_counter() - started, 0.6)
+
+    def test_django_pages_are_served(self):
+        """The Django application answers through the adapter."""
+        status, headers, body = self.run_one(
+            WsgiToAsgi(WSGIHandler(), 1), reverse('about:author')
+        )
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'text/html', headers[b'content-type'])
+        self.assertIn(b'</html>', body)
+
+
+class ConnectionReuseTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def make_wrapper(self, **settings):
+        settings = {
+            **connection.settings_dict,
+            'NAME': self.path,
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': {},
+            **settings,
+        }
+        wrapper = DatabaseWrapper(settings, f'reuse-{self.id()}')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pooled_connection_is_reused(self):
+        """A connection closed at the end of a request goes back to
+        the pool and serves the next one.
+        """
+        wrapper = self.make_wrapper(POOL={'SIZE': 1})
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(wrapper.connection)
+        wrapper.ensure_connection()
+
+        self.assertIs(wrapper.connection, raw)
+        self.assertEqual(wrapper.pool.stats(), {'idle': 0, 'in_use': 1})
+
+    def test_full_pool_times_out(self):
+        """Waiting past the timeout for a busy pool is an error."""
+        first = self.make_wrapper(POOL={'SIZE': 1, 'TIMEOUT': 0.05})
+        second = self.make_wrapper(POOL={'SIZE': 1, 'TIMEOUT': 0.05})
+        first.ensure_connection()
+        before = pool.TIMEOUTS.name, (('alias', first.alias),)
+        timeouts = metrics.registry.counters[before]
+
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+
+        self.assertEqual(metrics.registry.counters[before], timeouts + 1)
+
+    def test_broken_connection_is_replaced(self):
+        """A kept connection failing its health check is reopened."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=60)
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+
+        wrapper.close_if_unusable_or_obsolete()
+        with patch.object(wrapper, 'is_usable', return_value=False):
+            wrapper.ensure_connection()
+
+        self.assertIsNot(wrapper.connection, raw)
+
+    def test_connect_time_is_profiled(self):
+        """Opening a connection adds to the request profile."""
+        wrapper = self.make_wrapper()
+        profiling.start()
+        try:
+            wrapper.ensure_connection()
+        finally:
+            profile = profiling.stop()
+
+        self.assertGreater(profile.timings['connect'], 0)
+        self.assertIn('connect;dur=', profile.server_timing())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def serve(self, view, cookies=None):
+        """Run ``view`` behind the pinning middleware; it answers with
+        the databases its reads were routed to.
+        """
+        router = ReplicaRouter()
+
+        def routes(request):
+            return HttpResponse(','.join(
+                str(router.db_for_read(User)) for _ in view(router)
+            ))
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(replica_reads(routes))(request)
+
+    def test_marked_views_read_from_replica(self):
+        """Reads of a marked view go to a replica, others do not."""
+        response = self.serve(lambda router: [None])
+        unmarked = ReplicaRouter().db_for_read(User)
+
+        self.assertEqual(response.content, b'replica')
+        self.assertIsNone(unmarked)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        """A write moves the rest of the request and the visitor's
+        next requests to the primary.
+        """
+        def view(router):
+            yield
+            router.db_for_write(User)
+            yield
+
+        response = self.serve(view)
+        pinned = self.serve(lambda router: [None], {PIN_COOKIE: '1'})
+
+        self.assertEqual(response.content, b'replica,None')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(pinned.content, b'None')
+
+    def test_reads_in_a_transaction_stay_on_primary(self):
+        """Reads inside a transaction on the primary stay there."""
+        with patch.object(connection, 'in_atomic_block', True):
+            response = self.serve(lambda router: [None])
+
+        self.assertEqual(response.content, b'None')
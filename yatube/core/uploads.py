@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Streams every upload to a temporary file on disk.
+
+    Past ``UPLOAD_MAX_SIZE`` bytes the rest of the file is counted but
+    not written, so an oversized upload costs no disk space; its ``size``
+    still reports the full length for forms to reject it.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.UPLOAD_MAX_SIZE:
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+
+def oversized(upload):
+    """Whether the upload is over ``UPLOAD_MAX_SIZE``."""
+    return upload.size > settings.UPLOAD_MAX_SIZE
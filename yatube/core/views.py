@@ -1,6 +1,21 @@
+import os
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET, require_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from . import metrics, profiling
+from .serve import serve
+from .storage import CONTENT_NAME
 
 
 def page_not_found(request, exception):
@@ -35,3 +50,64 @@ def csrf_failure(request, reason=''):
         request,
         'core/403csrf.html'
     )
+
+
+@staff_member_required
+def performance(request):
+    """Rolling profile of sampled requests per view, as JSON."""
+    return JsonResponse(
+        profiling.summary(), json_dumps_params={'ensure_ascii': False}
+    )
+
+
+@require_GET
+def prometheus_metrics(request):
+    """Metrics of all worker processes in the Prometheus text format.
+
+    With ``METRICS_TOKEN`` set, scrapers must send it as a bearer token.
+    """
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f'Bearer {settings.METRICS_TOKEN}',
+    ):
+        return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+    return HttpResponse(
+        metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def _file(root, path):
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    return full_path if os.path.isfile(full_path) else None
+
+
+@require_safe
+def static_file(request, path):
+    """A collected static file, or one the finders locate before
+    collectstatic has run; fingerprinted names never expire.
+    """
+    full_path = _file(settings.STATIC_ROOT, path)
+    if full_path is None:
+        full_path = finders.find(path)
+    if full_path is None:
+        raise Http404
+    hashed = getattr(staticfiles_storage, 'hashed_files', {})
+    return serve(request, full_path, immutable=path in hashed.values())
+
+
+@require_safe
+def media_file(request, path):
+    """An uploaded file; content-addressed images and thumbnails never
+    expire.
+    """
+    full_path = _file(settings.MEDIA_ROOT, path)
+    if full_path is None:
+        raise Http404
+    immutable = bool(CONTENT_NAME.match(path)) or path.startswith(
+        sorl_settings.THUMBNAIL_PREFIX
+    )
+    return serve(request, full_path, immutable=immutable)
@@ -0,0 +1,232 @@
+"""Latency and query count benchmark of the feed views.
+
+Every view is requested through the Django test client against the
+heaviest rows in the database: the biggest group, the most prolific
+author, the most commented post and the reader with most follows.
+
+``concurrency`` instead fires requests at once through the ASGI adapter
+while every query is slowed down, comparing one serving thread, which
+is what a sync worker gets, with a pool of them.
+"""
+import asyncio
+import math
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.asgi import WsgiToAsgi
+
+from .models import Group, Post, UserStats
+
+METRICS = ('p50_ms', 'p99_ms', 'queries')
+
+
+def targets():
+    """``{view: (url, user to log in or None)}`` for the present data."""
+    found = {'index': (reverse('posts:index'), None)}
+    group = (
+        Group.objects.annotate(total=Count('posts'))
+        .order_by('-total', 'pk').first()
+    )
+    if group is not None:
+        found['group_posts'] = (
+            reverse('posts:group_posts', args=(group.slug,)), None
+        )
+    author = UserStats.objects.select_related('user').order_by(
+        '-posts_count', 'pk'
+    ).first()
+    if author is not None:
+        found['profile'] = (
+            reverse('posts:profile', args=(author.user.username,)), None
+        )
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    if post is not None:
+        found['post_detail'] = (
+            reverse('posts:post_detail', args=(post.pk,)), None
+        )
+    reader = UserStats.objects.select_related('user').order_by(
+        '-following_count', 'pk'
+    ).first()
+    if reader is not None:
+        found['follow_index'] = (reverse('posts:follow_index'), reader.user)
+    return found
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(url, user=None, requests=50, warmup=2, cold=False):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    queries = []
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} answered {response.status_code}.')
+        queries.append(len(captured.captured_queries))
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'queries': max(queries),
+    }
+
+
+def run(requests=50, warmup=2, cold=False):
+    return {
+        view: measure(url, user, requests, warmup, cold)
+        for view, (url, user) in targets().items()
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Rows of ``(view, metric, old, new, regressed)``.
+
+    A latency regresses when it grows by more than ``tolerance``; any
+    extra query is a regression.
+    """
+    rows = []
+    for view, metrics in results.items():
+        for metric in METRICS:
+            old = baseline.get(view, {}).get(metric)
+            if old is None:
+                continue
+            new = metrics[metric]
+            if metric == 'queries':
+                regressed = new > old
+            else:
+                regressed = new > old * (1 + tolerance)
+            rows.append((view, metric, old, new, regressed))
+    return rows
+
+
+@contextmanager
+def slow_database(delay):
+    """Delay every query by ``delay`` seconds on connections opened
+    meanwhile, standing in for a remote or overloaded database.
+    """
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    wrapped = []
+
+    def slow_down(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+        wrapped.append(connection)
+
+    connection_created.connect(slow_down)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(slow_down)
+        for slowed in wrapped:
+            if wrapper in slowed.execute_wrappers:
+                slowed.execute_wrappers.remove(wrapper)
+
+
+async def _request(application, url, headers):
+    messages = iter([{'type': 'http.request', 'body': b''}])
+    status = None
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    path, _, query = url.partition('?')
+    await application({
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': headers,
+        'server': ('testserver', 80),
+    }, receive, send)
+    return status
+
+
+def _session_headers(user):
+    headers = [(b'host', b'testserver')]
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        headers.append(
+            (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session}'.encode())
+        )
+    return headers
+
+
+def measure_concurrent(url, headers, requests, threads):
+    application = WsgiToAsgi(WSGIHandler(), max_workers=threads)
+
+    async def timed():
+        started = time.perf_counter()
+        status = await _request(application, url, headers)
+        if status != 200:
+            raise RuntimeError(f'{url} answered {status}.')
+        return (time.perf_counter() - started) * 1000
+
+    async def fire(count):
+        return await asyncio.gather(*(timed() for _ in range(count)))
+
+    try:
+        # Every thread opens its connection before the clock starts.
+        asyncio.run(fire(threads))
+        started = time.perf_counter()
+        timings = asyncio.run(fire(requests))
+        elapsed = time.perf_counter() - started
+    finally:
+        application.executor.shutdown()
+    return {
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+    }
+
+
+def concurrency(requests=32, threads=8, delay=0.02):
+    """``{view: {threads: metrics}}`` of ``requests`` simultaneous
+    requests served by one thread and by ``threads`` threads while
+    every query takes ``delay`` seconds longer.
+
+    Requests are made as the busiest reader, so the anonymous page
+    cache does not hide the database.
+    """
+    found = targets()
+    reader = found.get('follow_index', (None, None))[1]
+    headers = _session_headers(reader)
+    results = {}
+    with slow_database(delay):
+        for view, (url, _) in found.items():
+            results[view] = {
+                count: measure_concurrent(url, headers, requests, count)
+                for count in (1, threads)
+            }
+    return results
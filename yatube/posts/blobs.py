@@ -0,0 +1,103 @@
+"""Garbage collection of post image files.
+
+Post images live in content-addressed storage, so one file can back
+many posts. A file is referenced by every post whose ``image`` names
+it: the reference count is a count of those rows. Once the last post
+is deleted or given another image, the file and its thumbnails go.
+Files stored before content addressing are moved with ``rehash``.
+
+Saving a post with a new image and collecting a file both ``lock`` the
+file name until their transaction ends, so a file is never deleted
+between an upload reusing it and the post that refers to it being
+committed.
+"""
+import hashlib
+import logging
+import posixpath
+
+from django.db import connection, transaction
+from sorl.thumbnail import delete
+
+from core.storage import CONTENT_NAME
+
+from . import thumbnails
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def stored_name(image):
+    """The name the storage keeps ``image``, a post's field file, under.
+    """
+    if CONTENT_NAME.match(image.name):
+        return image.name
+    field = image.field
+    return field.storage.content_name(
+        field.generate_filename(image.instance, image.name), image
+    )
+
+
+def lock(name):
+    """Hold the image ``name`` until the current transaction ends."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            digest = hashlib.sha256(name.encode()).digest()
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)',
+                [int.from_bytes(digest[:8], 'big', signed=True)],
+            )
+        else:
+            # SQLite locks the whole database for the first write.
+            cursor.execute('UPDATE posts_post SET image = image WHERE 0 = 1')
+
+
+def collect(name):
+    """Delete the image ``name`` and its thumbnails unless a post still
+    uses it. Returns whether it was deleted.
+    """
+    if not name:
+        return False
+    with transaction.atomic():
+        lock(name)
+        if Post.objects.filter(image=name).exists():
+            return False
+        delete(thumbnails.source(name))
+        thumbnails.forget(name)
+    return True
+
+
+def release(name):
+    """Collect ``name`` once the current transaction commits.
+
+    The commit has happened by then: a failure is logged, not raised.
+    """
+    def run():
+        try:
+            collect(name)
+        except Exception:
+            logger.exception('Failed to collect image %s', name)
+
+    if name:
+        transaction.on_commit(run)
+
+
+def rehash(name):
+    """Move the image ``name`` to its content-addressed name, repoint
+    its posts and collect the old file.
+
+    Returns the new name, or ``None`` when the file is missing.
+    """
+    field = Post._meta.get_field('image')
+    storage = field.storage
+    if not storage.exists(name):
+        return None
+    upload_name = field.generate_filename(None, posixpath.basename(name))
+    with storage.open(name) as original, transaction.atomic():
+        new_name = storage.content_name(upload_name, original)
+        if new_name == name:
+            return name
+        lock(new_name)
+        storage.save(upload_name, original)
+        Post.objects.filter(image=name).update(image=new_name)
+    collect(name)
+    return new_name
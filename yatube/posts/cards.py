@@ -0,0 +1,98 @@
+"""Fragment cache of rendered post cards.
+
+A card is cached under its post id plus version stamps of the post,
+of its author and of all cards. Saving a post or renaming its author
+moves the stamp, so stale cards are never read again and simply expire;
+bulk changes such as an import move the stamp of all cards. Cards
+still showing a thumbnail placeholder are not cached, so they need no
+invalidating once the thumbnail is ready, and neither are cards of
+posts read from a replica, which may predate the stamps.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.db.replicas import is_replica
+from core.stamps import bump, get_stamps
+
+from . import thumbnails
+
+CARD_TEMPLATE = 'posts/includes/posts_list.html'
+CARD_TIMEOUT = 60 * 60 * 24
+ALL_CARDS = 'posts:card:v:all'
+
+
+def _post_version_key(post_id):
+    return f'posts:card:v:post:{post_id}'
+
+
+def _author_version_key(author_id):
+    return f'posts:card:v:author:{author_id}'
+
+
+def _card_key(post_id, post_version, author_version, all_version):
+    return (
+        f'posts:card:{post_id}:{post_version}:{author_version}:'
+        f'{all_version}'
+    )
+
+
+def render_cards(posts):
+    """Return ``(post, html)`` pairs for ``posts``.
+
+    Version stamps and cached cards are each read with one ``get_many``;
+    only the missing cards are rendered, with their thumbnails resolved
+    in one batch, and written back unless a thumbnail is pending or the
+    post came from a replica.
+    """
+    posts = list(posts)
+    versions = get_stamps({
+        ALL_CARDS,
+        *(
+            key
+            for post in posts
+            for key in (
+                _post_version_key(post.pk),
+                _author_version_key(post.author_id),
+            )
+        ),
+    })
+    keys = {
+        post.pk: _card_key(
+            post.pk,
+            versions[_post_version_key(post.pk)],
+            versions[_author_version_key(post.author_id)],
+            versions[ALL_CARDS],
+        )
+        for post in posts
+    }
+    cached = cache.get_many(keys.values())
+    thumbnails.attach(
+        post for post in posts if keys[post.pk] not in cached
+    )
+
+    rendered = {}
+    cards = []
+    for post in posts:
+        html = cached.get(keys[post.pk])
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {'post': post})
+            pending = post.image and post.thumbnail is None
+            if not pending and not is_replica(post._state.db):
+                rendered[keys[post.pk]] = html
+        cards.append((post, mark_safe(html)))
+    if rendered:
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return cards
+
+
+def invalidate_post(post_id):
+    bump(_post_version_key(post_id))
+
+
+def invalidate_author(author_id):
+    bump(_author_version_key(author_id))
+
+
+def invalidate_all():
+    bump(ALL_CARDS)
@@ -0,0 +1,80 @@
+"""Validators for conditional GETs of the feed and post pages.
+
+A validator answers "has the page changed?" without rendering it.
+Feeds and profiles are versioned by the page_cache stamps, which are
+bumped whenever a post in the feed is created, edited or deleted, so
+they cost no queries. The post page reads its ``updated`` time and
+comment count; new, edited and deleted comments move the post's
+``updated``. Pages differ per visitor, so the visitor's id and CSRF
+cookie are part of the ETag too.
+"""
+import datetime
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import page_cache
+from .models import Post
+
+Validator = namedtuple('Validator', 'etag last_modified')
+
+
+def _stamp_time(stamp):
+    return datetime.datetime.fromtimestamp(stamp / 1e9, tz=timezone.utc)
+
+
+def _validator(request, stamps, parts=(), times=()):
+    parts = [
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        *stamps,
+        *parts,
+    ]
+    return Validator(
+        hashlib.md5(repr(parts).encode()).hexdigest(),
+        max([*map(_stamp_time, stamps), *times]),
+    )
+
+
+def index(request):
+    return _validator(
+        request, page_cache.feed_stamps(page_cache.index_feed())
+    )
+
+
+def group_posts(request, slug):
+    return _validator(
+        request, page_cache.feed_stamps(page_cache.group_feed(slug))
+    )
+
+
+def profile(request, username):
+    # Every post is in the index feed; the visitor's follows decide
+    # the follow button.
+    feeds = [page_cache.index_feed()]
+    if request.user.is_authenticated:
+        feeds.append(page_cache.follows_feed(request.user.pk))
+    return _validator(request, page_cache.feed_stamps(*feeds))
+
+
+def post_detail(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values(
+            'updated',
+            'comments_count',
+            'author__stats__posts_count',
+            'group__title',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return _validator(
+        request,
+        page_cache.feed_stamps(),
+        row.values(),
+        [row['updated']],
+    )
@@ -0,0 +1,122 @@
+from django.db import connection
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+USER_COUNTERS = ['posts_count', 'followers_count', 'following_count']
+
+
+def bump_user(user_id, **deltas):
+    """Atomically shift the user's counters by the given deltas."""
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def bump_post(post_id, **deltas):
+    """Atomically shift the post's counters by the given deltas.
+
+    The post counts as changed, so its page stops matching the
+    validators browsers hold.
+    """
+    Post.objects.filter(pk=post_id).update(
+        updated=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def _count(queryset, field):
+    """Correlated ``COUNT(*)`` of ``queryset`` rows pointing at the outer pk.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _write(model, objs, fields, create):
+    """Insert or update ``objs`` with one statement per batch."""
+    if not objs:
+        return
+    # Django 2.2 lets an explicit batch_size exceed the backend limit.
+    batch_size = min(BATCH_SIZE, connection.ops.bulk_batch_size(
+        ['pk', *fields] if create else ['pk', 'pk', *fields], objs
+    ))
+    if create:
+        model.objects.bulk_create(objs, batch_size=batch_size)
+    else:
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+
+def rebuild_user_stats():
+    """Recount every user's counters, fixing rows that drifted.
+
+    Missing and drifted rows are written in batches. Returns the number
+    of created or corrected rows.
+    """
+    fixed = 0
+    users = User.objects.annotate(
+        real_posts=_count(Post.objects.all(), 'author'),
+        real_followers=_count(Follow.objects.all(), 'author'),
+        real_following=_count(Follow.objects.all(), 'user'),
+    ).select_related('stats').order_by('pk')
+
+    missing, drifted = [], []
+    for user in users.iterator():
+        real = {
+            'posts_count': user.real_posts,
+            'followers_count': user.real_followers,
+            'following_count': user.real_following,
+        }
+        stats = getattr(user, 'stats', None)
+        if stats is None:
+            missing.append(UserStats(user_id=user.pk, **real))
+        elif any(getattr(stats, key) != value for key, value in real.items()):
+            drifted.append(UserStats(user_id=user.pk, **real))
+        else:
+            continue
+        fixed += 1
+        if len(missing) == BATCH_SIZE:
+            _write(UserStats, missing, USER_COUNTERS, create=True)
+            missing = []
+        if len(drifted) == BATCH_SIZE:
+            _write(UserStats, drifted, USER_COUNTERS, create=False)
+            drifted = []
+    _write(UserStats, missing, USER_COUNTERS, create=True)
+    _write(UserStats, drifted, USER_COUNTERS, create=False)
+    return fixed
+
+
+def rebuild_post_stats():
+    """Recount comments of every post, fixing rows that drifted.
+
+    Drifted rows are written in batches. Returns the number of
+    corrected rows.
+    """
+    fixed = 0
+    posts = (
+        Post.objects
+        .annotate(real_comments=_count(Comment.objects.all(), 'post'))
+        .exclude(comments_count=F('real_comments'))
+        .order_by()
+        .values_list('pk', 'real_comments')
+    )
+    drifted = []
+    for post_id, real_comments in posts.iterator():
+        drifted.append(Post(pk=post_id, comments_count=real_comments))
+        fixed += 1
+        if len(drifted) == BATCH_SIZE:
+            _write(Post, drifted, ['comments_count'], create=False)
+            drifted = []
+    _write(Post, drifted, ['comments_count'], create=False)
+    return fixed
@@ -2,17 +2,96 @@ from functools import wraps
 
 from django.shortcuts import redirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
 
+from core.db.replicas import read_replica
+
+from . import page_cache
 from .models import Post
 
 
-def user_is_author(func):
-    @wraps(func)
-    def check_user(request, *args, **kwargs):
-        author = get_object_or_404(Post, pk=kwargs['post_id']).author
-        if request.user == author:
-            return func(request, *args, **kwargs)
+def owner_required(queryset, url_kwarg, denied):
+    """Let only the author of the object named by ``url_kwarg`` through.
+    The object is loaded once from ``queryset``, which should load
+    ``author`` and whatever the view needs, and is passed to the view
+    under its model name; anyone else gets ``denied(obj)``.
+    """
+    name = queryset.model._meta.model_name
+
+    def decorator(func):
+        @wraps(func)
+        def check_owner(request, *args, **kwargs):
+            obj = get_object_or_404(queryset, pk=kwargs[url_kwarg])
+            if obj.author_id != request.user.pk:
+                return denied(obj)
+            return func(request, *args, **kwargs, **{name: obj})
+
+        return check_owner
+
+    return decorator
+
+
+user_is_author = owner_required(
+    Post.objects.for_edit(),
+    'post_id',
+    lambda post: redirect('posts:post_detail', post_id=post.pk),
+)
+
+
+def cache_anonymous_page(feed):
+    """Serve the view to anonymous users from the full-page cache.
+    ``feed`` maps the view kwargs to the name of the feed it renders.
+    """
+    def decorator(func):
+        @wraps(func)
+        def serve_cached(request, *args, **kwargs):
+            return page_cache.serve(
+                request, feed(**kwargs), func, *args, **kwargs
+            )
+
+        return serve_cached
+
+    return decorator
+
+
+def conditional_page(validator):
+    """Answer conditional GETs with 304 while the page is unchanged.
+    ``validator`` is one of ``posts.conditional``; it runs once per
+    request and returns ``None`` for pages that do not exist. Pages
+    rendered from a replica are sent without validators, as they may be
+    older than the stamps the validators carry.
+    """
+    def validate(request, *args, **kwargs):
+        if not hasattr(request, 'page_validator'):
+            request.page_validator = validator(request, *args, **kwargs)
+        return request.page_validator
+
+    def etag(request, *args, **kwargs):
+        checked = validate(request, *args, **kwargs)
+        return checked and checked.etag
+
+    def last_modified(request, *args, **kwargs):
+        checked = validate(request, *args, **kwargs)
+        return checked and checked.last_modified
+
+    def decorator(func):
+        conditional = condition(etag, last_modified)(func)
+
+        @wraps(func)
+        def revalidated(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if response.status_code == 200 and read_replica():
+                del response['ETag']
+                del response['Last-Modified']
+            # Browsers must ask before reusing a page.
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
 
-        return redirect('posts:post_detail', post_id=kwargs['post_id'])
+        return revalidated
 
-    return check_user
+    return decorator
@@ -1,5 +1,11 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from core.uploads import oversized
+
+from . import images
 from .models import Post, Comment
 
 
@@ -8,6 +14,37 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # An oversized upload was only partly stored: reject it before
+        # the image field tries to decode it.
+        self.oversized_image = None
+        image = self.files.get('image')
+        if image is not None and oversized(image):
+            self.files = self.files.copy()
+            del self.files['image']
+            self.oversized_image = image
+
+    def clean_image(self):
+        if self.oversized_image is not None:
+            raise forms.ValidationError(
+                'Картинка больше %s.'
+                % filesizeformat(settings.UPLOAD_MAX_SIZE),
+                code='file_size',
+            )
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            normalized = images.normalize(image)
+            self.instance.image_width = normalized.width
+            self.instance.image_height = normalized.height
+            self.instance.image_blurhash = normalized.blurhash
+            return normalized.file
+        if image is False:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            self.instance.image_blurhash = ''
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,72 @@
+"""Normalisation of uploaded post images.
+
+An upload is decoded once: rotated upright by its EXIF orientation,
+reduced to ``IMAGE_MAX_DIMENSION`` pixels per side and re-encoded as
+WebP, or as progressive JPEG where Pillow lacks WebP. Metadata is not
+copied over. Size and blurhash are measured on the decoded image, so
+pages can lay the image out without opening the file.
+"""
+import io
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from core import blurhash
+
+Normalized = namedtuple('Normalized', 'file width height blurhash')
+
+
+def _format():
+    if features.check('webp'):
+        return 'WEBP', '.webp'
+    return 'JPEG', '.jpg'
+
+
+def normalize(upload):
+    """Re-encode an uploaded image, returning a ``Normalized``."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        limit = settings.IMAGE_MAX_DIMENSION
+        if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Слишком большое разрешение картинки.',
+                code='image_pixels',
+            )
+        # JPEG can decode straight to a reduced scale.
+        image.draft('RGB', (limit, limit))
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image'
+        )
+
+    image_format, extension = _format()
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if has_alpha and image_format == 'WEBP':
+        image = image.convert('RGBA')
+    else:
+        image = image.convert('RGB')
+    image.thumbnail((limit, limit), Image.LANCZOS)
+
+    output = io.BytesIO()
+    if image_format == 'WEBP':
+        image.save(output, 'WEBP', quality=settings.IMAGE_QUALITY, method=4)
+    else:
+        image.save(
+            output, 'JPEG', quality=settings.IMAGE_QUALITY,
+            optimize=True, progressive=True,
+        )
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return Normalized(
+        ContentFile(output.getvalue(), name=stem + extension),
+        image.width,
+        image.height,
+        blurhash.encode(image),
+    )
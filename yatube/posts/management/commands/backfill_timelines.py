@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import TimelineState, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild materialized follow feeds from the follow graph. '
+        'Run after bulk loads or after changing FEED_FANOUT_LIMIT or '
+        'FEED_TIMELINE_LENGTH.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Readers to rebuild. Defaults to every built timeline.',
+        )
+
+    def handle(self, *args, **options):
+        if options['usernames']:
+            user_ids = User.objects.filter(
+                username__in=options['usernames']
+            ).values_list('pk', flat=True)
+        else:
+            user_ids = TimelineState.objects.values_list('user_id', flat=True)
+
+        rebuilt = 0
+        for user_id in list(user_ids):
+            timeline.build(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines.'))
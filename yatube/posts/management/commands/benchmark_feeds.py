@@ -0,0 +1,94 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the feed views through the test client and report p50/p99 '
+        'latency and query counts, optionally against a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Clear the cache before every request.',
+        )
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Write the results as a JSON baseline.',
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Compare with a baseline saved by --save.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed latency growth over the baseline, as a fraction.',
+        )
+        parser.add_argument(
+            '--concurrent', action='store_true',
+            help=(
+                'Fire the requests at once through the ASGI adapter with '
+                'a slowed down database, one thread against --threads.'
+            ),
+        )
+        parser.add_argument(
+            '--threads', type=int, default=settings.ASGI_THREADS,
+        )
+        parser.add_argument(
+            '--slow-db', type=float, default=20, metavar='MS',
+            help='Delay added to every query with --concurrent.',
+        )
+
+    def handle(self, *args, **options):
+        # Allows the test client's host and records rendered templates.
+        setup_test_environment()
+        if options['concurrent']:
+            return self.concurrent(options)
+        results = benchmark.run(
+            options['requests'], options['warmup'], options['cold']
+        )
+        for view, metrics in results.items():
+            self.stdout.write(
+                f'{view:<14} p50 {metrics["p50_ms"]:>8.2f} ms  '
+                f'p99 {metrics["p99_ms"]:>8.2f} ms  '
+                f'{metrics["queries"]} queries'
+            )
+
+        if options['save']:
+            with open(options['save'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                rows = benchmark.compare(
+                    results, json.load(baseline), options['tolerance']
+                )
+            regressions = [row for row in rows if row[4]]
+            for view, metric, old, new, regressed in rows:
+                style = self.style.ERROR if regressed else self.style.SUCCESS
+                self.stdout.write(style(f'{view} {metric}: {old} -> {new}'))
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} metrics regressed past the baseline.'
+                )
+
+    def concurrent(self, options):
+        results = benchmark.concurrency(
+            options['requests'], options['threads'], options['slow_db'] / 1000
+        )
+        for view, runs in results.items():
+            for threads, metrics in runs.items():
+                self.stdout.write(
+                    f'{view:<14} {threads:>3} threads  '
+                    f'{metrics["rps"]:>7.1f} req/s  '
+                    f'p50 {metrics["p50_ms"]:>8.2f} ms  '
+                    f'p99 {metrics["p99_ms"]:>8.2f} ms'
+                )
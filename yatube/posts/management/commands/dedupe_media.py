@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs, cards, page_cache
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Move post images stored before content addressing to their '
+        'content hash, merging identical files. Run generate_thumbnails '
+        'afterwards.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = list(
+            Post.objects.exclude(image='').order_by('image')
+            .values_list('image', flat=True).distinct()
+        )
+        moved = missing = stored = 0
+        blobs_left = set()
+        for name in names:
+            if storage.exists(name):
+                stored += storage.size(name)
+            new_name = blobs.rehash(name)
+            if new_name is None:
+                missing += 1
+                self.stderr.write(f'{name}: file is missing')
+                continue
+            if new_name != name:
+                moved += 1
+                for post_id in Post.objects.filter(
+                    image=new_name
+                ).values_list('pk', flat=True):
+                    cards.invalidate_post(post_id)
+            blobs_left.add(new_name)
+        if moved:
+            page_cache.purge_all()
+        freed = stored - sum(storage.size(name) for name in blobs_left)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} of {len(names)} images into '
+            f'{len(blobs_left)} files, freed {freed} bytes, '
+            f'{missing} missing.'
+        ))
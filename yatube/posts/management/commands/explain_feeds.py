@@ -0,0 +1,109 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Post
+from posts.seeding import seed
+
+FEED_SIZE = 11
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Print query plans of the feed access paths with the composite '
+        'indexes in place and with them dropped, optionally after seeding '
+        'a synthetic dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-posts', type=int, default=0,
+            help='Seed this many posts first, e.g. 1000000.',
+        )
+        parser.add_argument('--seed-authors', type=int, default=1000)
+        parser.add_argument('--seed-groups', type=int, default=50)
+
+    def access_paths(self):
+        post = Post.objects.exclude(group=None).order_by('-pk').first()
+        follow = Follow.objects.order_by('-pk').first()
+        if post is None:
+            return {}
+        paths = {
+            'index feed': Post.objects.for_feed()[:FEED_SIZE],
+            'profile feed': (
+                Post.objects.for_feed()
+                .filter(author_id=post.author_id)[:FEED_SIZE]
+            ),
+            'group feed': (
+                Post.objects.for_feed()
+                .filter(group_id=post.group_id)[:FEED_SIZE]
+            ),
+            'post comments': (
+                Comment.objects.filter(post_id=post.pk)
+                .select_related('author')[:FEED_SIZE]
+            ),
+        }
+        if follow is not None:
+            paths['followers of author'] = Follow.objects.filter(
+                author_id=follow.author_id
+            ).values_list('user_id', flat=True)
+        return paths
+
+    def explain(self, paths):
+        return {name: queryset.explain() for name, queryset in paths.items()}
+
+    def plans_without_indexes(self, paths):
+        plans = {}
+        editor = connection.SchemaEditorClass(connection)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for model in (Post, Comment, Follow):
+                    for index in model._meta.indexes:
+                        cursor.execute(str(index.remove_sql(model, editor)))
+                plans = self.explain(paths)
+                raise Rollback
+        except Rollback:
+            pass
+        return plans
+
+    def handle(self, *args, **options):
+        if options['seed_posts']:
+            started = time.monotonic()
+            with transaction.atomic():
+                seed(
+                    posts=options['seed_posts'],
+                    authors=options['seed_authors'],
+                    groups=options['seed_groups'],
+                    comments=options['seed_posts'] // 10,
+                    follows=options['seed_authors'] * 10,
+                )
+            self.stdout.write(
+                f'Seeded {options["seed_posts"]} posts '
+                f'in {time.monotonic() - started:.1f}s.'
+            )
+
+        paths = self.access_paths()
+        if not paths:
+            self.stdout.write('No posts: use --seed-posts.')
+            return
+
+        unindexed = self.plans_without_indexes(paths)
+        # A fresh connection drops prepared statements planned
+        # against the rolled back schema.
+        connection.close()
+        indexed = self.explain(paths)
+        for name in paths:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for title, plan in (
+                ('with indexes', indexed[name]),
+                ('without indexes', unindexed[name]),
+            ):
+                self.stdout.write(f'  {title}:')
+                self.stdout.write(
+                    '\n'.join(f'    {line}' for line in plan.splitlines())
+                )
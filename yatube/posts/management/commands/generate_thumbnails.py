@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _render(name):
+    try:
+        thumbnails.generate(name)
+    except Exception as error:
+        return name, error
+    return name, None
+
+
+class Command(BaseCommand):
+    help = (
+        'Render missing thumbnails of post images in parallel. '
+        'Run after bulk imports or after changing thumbnail sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Processes to render with. Defaults to one per core.',
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by('image').values_list(
+            'image', flat=True
+        ).distinct()
+        jobs = [
+            name for name in names.iterator()
+            if thumbnails.get_ready(name) is None
+        ]
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('No thumbnails missing.'))
+            return
+
+        # Forked workers must not share the parent's connections.
+        connections.close_all()
+        rendered = failed = 0
+        with ProcessPoolExecutor(
+            options['workers'], initializer=django.setup
+        ) as pool:
+            futures = [pool.submit(_render, name) for name in jobs]
+            for future in as_completed(futures):
+                name, error = future.result()
+                if error is None:
+                    thumbnails.refresh(name)
+                    rendered += 1
+                else:
+                    thumbnails.fail(name)
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered thumbnails of {rendered} images, {failed} failed.'
+        ))
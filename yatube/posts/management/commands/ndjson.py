@@ -0,0 +1,64 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import cards, counters, page_cache, search, transfer
+
+
+def _open(path, mode):
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream users, groups, posts, comments and follows to or from an '
+        'NDJSON file (gzipped if it ends with .gz, "-" for stdio). '
+        'Media files are not included.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('direction', choices=('export', 'import'))
+        parser.add_argument('path')
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Skip rows whose primary key already exists on import.',
+        )
+
+    def progress(self, label, rows):
+        self.stderr.write(f'{label}: {rows} rows')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['direction'] == 'export':
+            with _open(path, 'w') as stream:
+                throughput = transfer.dump(stream, progress=self.progress)
+        else:
+            try:
+                with _open(path, 'r') as stream, transaction.atomic():
+                    throughput = transfer.load(
+                        stream,
+                        ignore_conflicts=options['ignore_conflicts'],
+                        progress=self.progress,
+                    )
+                    # bulk_create skips signals: refresh what they keep.
+                    counters.rebuild_user_stats()
+                    counters.rebuild_post_stats()
+                    if search.is_supported():
+                        search.reindex()
+                # Cached pages and cards show what was there before.
+                page_cache.purge_all()
+                cards.invalidate_all()
+            except (LookupError, OSError, ValueError) as error:
+                raise CommandError(error)
+        for line in throughput.lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["direction"].capitalize()}ed '
+            f'{sum(throughput.rows.values())} rows.'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import rebuild_post_stats, rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized post and user counters that have drifted.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = rebuild_user_stats()
+            posts = rebuild_post_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed counters: users {users}, posts {posts}.'
+        ))
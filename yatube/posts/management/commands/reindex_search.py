@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search index of posts and comments. '
+        'Run after bulk loads and after migrating existing data.'
+    )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                'Full-text search needs PostgreSQL or SQLite with FTS5.'
+            )
+        documents = search.reindex()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {documents} documents.'
+        ))
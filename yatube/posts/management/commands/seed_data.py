@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters, search
+from posts.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-generate users, groups, posts, comments and follows with '
+        'zipfian activity and follower counts and bursty comments.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=50000)
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of activity and popularity; 0 is uniform.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Spread post dates over this many past days.',
+        )
+        parser.add_argument(
+            '--burst-minutes', type=float, default=30,
+            help='Mean delay between a post and its comments.',
+        )
+        parser.add_argument(
+            '--random-seed', type=int,
+            help='Seed the generator to reproduce the same data set.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            seed(
+                posts=options['posts'],
+                authors=options['authors'],
+                groups=options['groups'],
+                comments=options['comments'],
+                follows=options['follows'],
+                rng=random.Random(options['random_seed']),
+                skew=options['skew'],
+                days=options['days'],
+                burst_minutes=options['burst_minutes'],
+            )
+            # Rows were bulk inserted past the signals.
+            counters.rebuild_user_stats()
+            counters.rebuild_post_stats()
+            if search.is_supported():
+                search.reindex()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["posts"]} posts, {options["comments"]} '
+            f'comments and {options["follows"]} follows '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
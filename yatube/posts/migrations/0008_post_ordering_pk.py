@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_auto_20220128_1559'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ['-pub_date', '-id'], 'verbose_name': 'Публикация', 'verbose_name_plural': 'Публикации'},
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.28 on 2026-10-18 10:05
+
+from django.db import migrations
+
+
+def is_supported(connection):
+    """Whether the database can hold the search table: PostgreSQL, or
+    SQLite built with FTS5.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return ('ENABLE_FTS5',) in cursor.fetchall()
+    return connection.vendor == 'postgresql'
+
+
+def create_search_table(apps, schema_editor):
+    """Inverted index of post and comment texts, see posts.search.
+    Existing rows are indexed by the reindex_search command.
+    """
+    connection = schema_editor.connection
+    if not is_supported(connection):
+        return
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE posts_search ('
+            'id bigint PRIMARY KEY, post_id integer NOT NULL, '
+            'body text NOT NULL, document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX posts_search_document_idx '
+            'ON posts_search USING GIN (document)'
+        )
+    else:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5('
+            "body, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_thread'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Thumbnail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=100, verbose_name='Картинка')),
+                ('size', models.CharField(max_length=16, verbose_name='Размер')),
+                ('name', models.CharField(max_length=255, verbose_name='Файл миниатюры')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина миниатюры')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота миниатюры')),
+            ],
+            options={
+                'verbose_name': 'Миниатюра',
+                'verbose_name_plural': 'Миниатюры',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='thumbnail',
+            constraint=models.UniqueConstraint(fields=('image', 'size'), name='Уникальная миниатюра'),
+        ),
+    ]
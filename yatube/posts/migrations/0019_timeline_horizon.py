@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelinestate',
+            name='horizon',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Граница ленты'),
+        ),
+    ]
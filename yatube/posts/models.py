@@ -1,9 +1,11 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.fields import (
-    CharField, DateTimeField, SlugField, TextField
+    CharField, DateTimeField, IntegerField, SlugField, TextField
 )
-from django.db.models.fields.related import ForeignKey
+from django.db.models.fields.related import ForeignKey, OneToOneField
+
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -25,6 +27,46 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Posts ready for a feed page: author and group are joined
+        in the same query and only the columns the post card shows
+        are loaded.
+        """
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'image_width',
+            'image_height',
+            'image_blurhash',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group',
+            'group__title',
+            'group__slug',
+            'group__description',
+        )
+
+    def for_edit(self):
+        """Posts ready for the edit form: the author to check and the
+        columns the form writes. Counters are left out so saving the
+        form does not overwrite them.
+        """
+        return self.only(
+            'author',
+            'text',
+            'group',
+            'image',
+            'image_width',
+            'image_height',
+            'image_blurhash',
+            'updated',
+        )
+
+
 class Post(models.Model):
     """The Post class describes the structure of posts on Yatube.
     It has the next attributes: text, pub_date, author, group.
@@ -37,11 +79,17 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated = DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    # Both keys lead the feed indexes in Meta, which serve their lookups.
     author = ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        db_index=False,
     )
     group = ForeignKey(
         Group,
@@ -50,29 +98,74 @@ class Post(models.Model):
         on_delete=models.SET_NULL,
         related_name='posts',
         verbose_name='Группа',
-        help_text='Выберите группу'
+        help_text='Выберите группу',
+        db_index=False,
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+        # Posts sharing a file are counted before it is collected.
+        db_index=True,
+    )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
         blank=True,
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_blurhash = CharField(
+        'Blurhash картинки',
+        max_length=64,
+        blank=True,
+        editable=False,
+    )
+    comments_count = IntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Публикация'
         verbose_name_plural = 'Публикации'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
 
 class Comment(models.Model):
+    # Indexed by comment_thread_idx.
     post = ForeignKey(
         Post,
         related_name='comments',
         verbose_name='Публикация',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     author = ForeignKey(
         User,
@@ -88,27 +181,42 @@ class Comment(models.Model):
         'Дата публикации комментария',
         auto_now_add=True,
     )
+    updated = DateTimeField(
+        'Дата изменения комментария',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_thread_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
 
 
 class Follow(models.Model):
+    # Indexed by the unique constraint.
     user = ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False,
     )
+    # Indexed by follow_author_user_idx.
     author = ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
-        verbose_name='Контентмейкер'
+        verbose_name='Контентмейкер',
+        db_index=False,
     )
 
     class Meta:
@@ -120,3 +228,117 @@ class Follow(models.Model):
                 name='Уникальная подписка'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Denormalized per-user counters kept in sync by posts.signals.
+    Use the rebuild_counters command to repair drifted values.
+    """
+    user = OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = IntegerField('Количество постов', default=0)
+    followers_count = IntegerField('Количество подписчиков', default=0)
+    following_count = IntegerField('Количество подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """A post materialized into a reader's follow feed (fan-out on write).
+    """
+    # Indexed by the unique constraint and timeline_feed_idx.
+    user = ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        db_index=False,
+    )
+    post = ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Публикация',
+    )
+    # Copied from the post, so feed pages are read from this table alone.
+    pub_date = DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='Уникальная запись ленты'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_feed_idx',
+            ),
+        ]
+
+
+class TimelineState(models.Model):
+    """Marks a reader whose timeline has been materialized."""
+    user = OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='timeline_state',
+        verbose_name='Читатель',
+    )
+    built = DateTimeField('Дата построения ленты', auto_now=True)
+    pulled = DateTimeField(
+        'Дата последнего чтения популярных авторов', null=True, blank=True
+    )
+    # Entries hold every followed post newer than this.
+    horizon = DateTimeField('Граница ленты', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Состояние ленты'
+        verbose_name_plural = 'Состояния лент'
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class Thumbnail(models.Model):
+    """A rendered thumbnail of a post image file at one of the sizes of
+    posts.thumbnails, recorded by the thumbnail workers.
+    """
+    image = CharField('Картинка', max_length=100)
+    size = CharField('Размер', max_length=16)
+    name = CharField('Файл миниатюры', max_length=255)
+    width = models.PositiveIntegerField('Ширина миниатюры')
+    height = models.PositiveIntegerField('Высота миниатюры')
+
+    class Meta:
+        verbose_name = 'Миниатюра'
+        verbose_name_plural = 'Миниатюры'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['image', 'size'],
+                name='Уникальная миниатюра'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.name
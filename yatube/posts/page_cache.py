@@ -0,0 +1,103 @@
+"""Full-page cache of feeds for anonymous visitors.
+
+Pages are keyed on the view, its slug and the pagination query plus
+the version stamps of the feed and of all feeds; posts.signals bumps
+the stamps when a post in the feed is created, edited or deleted.
+Missed pages are rendered from the primary: a lagging replica would
+store the old page under the new stamps.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from core.db.replicas import primary_reads
+from core.stamps import bump, get_stamps
+
+from .models import Group
+
+ALL_FEEDS = 'posts:page:v:all'
+CACHED_PARAMS = ('cursor', 'page')
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def follows_feed(user_id):
+    """Not a page of its own: profiles show whether the visitor
+    follows the author.
+    """
+    return f'follows:{user_id}'
+
+
+def _stamp_key(feed):
+    return f'posts:page:v:{feed}'
+
+
+def feed_stamps(*feeds):
+    """Current stamps of all feeds and of each of ``feeds``, in order."""
+    keys = [ALL_FEEDS, *map(_stamp_key, feeds)]
+    stamps = get_stamps(keys)
+    return [stamps[key] for key in keys]
+
+
+def _page_key(request, feed):
+    all_feeds, stamp = feed_stamps(feed)
+    query = '&'.join(
+        f'{param}={request.GET.get(param, "")}' for param in CACHED_PARAMS
+    )
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f'posts:page:{feed}:{all_feeds}:{stamp}:{digest}'
+
+
+def serve(request, feed, view, *args, **kwargs):
+    """Serve an anonymous request from the cache, filling it on a miss.
+    """
+    if request.user.is_authenticated:
+        response = view(request, *args, **kwargs)
+        response['X-Cache'] = 'BYPASS'
+    else:
+        key = _page_key(request, feed)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+        else:
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    settings.ANONYMOUS_PAGE_CACHE_TIMEOUT,
+                )
+            response['X-Cache'] = 'MISS'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def purge(*feeds):
+    bump(*(_stamp_key(feed) for feed in feeds))
+
+
+def purge_all():
+    bump(ALL_FEEDS)
+
+
+def purge_post(post):
+    """Purge the feeds showing ``post``: the index and its group's, or
+    the group it was just moved out of.
+    """
+    group_ids = {post.group_id, getattr(post, '_loaded_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True
+    )
+    purge(index_feed(), *(group_feed(slug) for slug in slugs))
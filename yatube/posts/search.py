@@ -0,0 +1,200 @@
+"""Full-text search over posts and their comments.
+
+Texts are kept in the posts_search table, created by migration 0013: a
+``tsvector`` column under a GIN index on PostgreSQL, an FTS5 virtual
+table on SQLite. A row's id encodes the document, ``2 * pk`` for a post
+and ``2 * pk + 1`` for a comment, so updates hit the primary key.
+posts.signals keeps the table in step; reindex_search rebuilds it.
+Other databases, SQLite built without FTS5 and databases migrated
+without the table fall back to ``LIKE`` scans without snippets.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+BATCH_SIZE = 1000
+RESULTS_LIMIT = 50
+SNIPPET_WORDS = 16
+# Private use characters mark matches until the snippet is escaped.
+START, STOP = '\ue000', '\ue001'
+
+WORD_RE = re.compile(r'\w+')
+
+
+_sqlite_fts5 = None
+_tables = {}
+
+
+def _has_fts5(conn):
+    """Whether SQLite was built with FTS5. Every connection shares the
+    library, so it is asked once.
+    """
+    global _sqlite_fts5
+    if _sqlite_fts5 is None:
+        with conn.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            _sqlite_fts5 = ('ENABLE_FTS5',) in cursor.fetchall()
+    return _sqlite_fts5
+
+
+def _has_table(conn):
+    """Whether the database was migrated with the search table. Asked
+    once per database.
+    """
+    if conn.alias not in _tables:
+        _tables[conn.alias] = TABLE in conn.introspection.table_names()
+    return _tables[conn.alias]
+
+
+def is_supported(conn=connection):
+    if conn.vendor == 'sqlite':
+        return _has_fts5(conn) and _has_table(conn)
+    return conn.vendor == 'postgresql' and _has_table(conn)
+
+
+def post_document_id(post_id):
+    return 2 * post_id
+
+
+def comment_document_id(comment_id):
+    return 2 * comment_id + 1
+
+
+def _insert_sql():
+    if connection.vendor == 'postgresql':
+        return (
+            f'INSERT INTO {TABLE} (id, post_id, body, document) '
+            'VALUES (%s, %s, %s, to_tsvector(%s::regconfig, %s))'
+        )
+    return f'INSERT INTO {TABLE} (rowid, post_id, body) VALUES (%s, %s, %s)'
+
+
+def _params(document_id, post_id, body):
+    if connection.vendor == 'postgresql':
+        return [document_id, post_id, body, settings.SEARCH_CONFIG, body]
+    return [document_id, post_id, body]
+
+
+def _id_column():
+    return 'id' if connection.vendor == 'postgresql' else 'rowid'
+
+
+def index(document_id, post_id, body):
+    """Add or replace one document."""
+    if not is_supported():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE {_id_column()} = %s', [document_id]
+        )
+        cursor.execute(_insert_sql(), _params(document_id, post_id, body))
+
+
+def remove(document_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE {_id_column()} = %s', [document_id]
+        )
+
+
+def reindex():
+    """Rebuild the whole table; returns the number of documents."""
+    documents = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        sources = (
+            (Post.objects.values_list('pk', 'pk', 'text'),
+             post_document_id),
+            (Comment.objects.values_list('pk', 'post_id', 'text'),
+             comment_document_id),
+        )
+        for rows, document_id in sources:
+            batch = []
+            for pk, post_id, body in rows.order_by('pk').iterator():
+                batch.append(_params(document_id(pk), post_id, body))
+                if len(batch) == BATCH_SIZE:
+                    cursor.executemany(_insert_sql(), batch)
+                    documents += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(_insert_sql(), batch)
+                documents += len(batch)
+    return documents
+
+
+def _match_sql():
+    if connection.vendor == 'postgresql':
+        return (
+            'SELECT post_id, ts_headline(%s::regconfig, body, query, %s) '
+            f'FROM {TABLE}, plainto_tsquery(%s::regconfig, %s) query '
+            'WHERE document @@ query '
+            'ORDER BY ts_rank_cd(document, query) DESC LIMIT %s'
+        )
+    return (
+        f"SELECT post_id, snippet({TABLE}, 0, %s, %s, '…', %s) "
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank LIMIT %s'
+    )
+
+
+def _match_params(words, limit):
+    if connection.vendor == 'postgresql':
+        config = settings.SEARCH_CONFIG
+        options = (
+            f'StartSel={START}, StopSel={STOP}, '
+            f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+        )
+        return [config, options, config, ' '.join(words), limit]
+    # Every word must match, as a prefix to make up for the lack of
+    # stemming in the unicode61 tokenizer.
+    query = ' '.join(f'"{word}"*' for word in words)
+    return [START, STOP, SNIPPET_WORDS, query, limit]
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(START, '<mark>').replace(STOP, '</mark>')
+    )
+
+
+def _ranked(words, limit):
+    """``(post_id, snippet)`` of the best matching document per post."""
+    with connection.cursor() as cursor:
+        # A post can match by its text and by many comments: read a few
+        # extra documents so deduplication still fills the page.
+        cursor.execute(_match_sql(), _match_params(words, limit * 4))
+        rows = cursor.fetchall()
+    best = {}
+    for post_id, snippet in rows:
+        best.setdefault(post_id, snippet)
+    return list(best.items())[:limit]
+
+
+def search(query, limit=RESULTS_LIMIT):
+    """Posts matching ``query`` as ``(post, snippet)`` pairs, best first.
+    """
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return []
+    if not is_supported():
+        text = ' '.join(words)
+        posts = Post.objects.for_feed().filter(
+            Q(text__icontains=text) | Q(comments__text__icontains=text)
+        ).distinct()[:limit]
+        return [(post, post.text) for post in posts]
+
+    ranked = _ranked(words, limit)
+    posts = Post.objects.for_feed().in_bulk([post_id for post_id, _ in ranked])
+    return [
+        (posts[post_id], _highlight(snippet))
+        for post_id, snippet in ranked
+        if post_id in posts
+    ]
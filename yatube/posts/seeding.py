@@ -0,0 +1,145 @@
+"""Bulk generation of synthetic data for benchmarks.
+
+The data is skewed the way a real site is: post counts per author and
+followers per author follow a zipfian distribution, most comments land
+on a few hot posts, and they arrive in bursts shortly after the post.
+"""
+import datetime
+import itertools
+import random
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, User
+from .transfer import keep_timestamps
+
+BATCH_SIZE = 5000
+
+
+def _batched(objects, model):
+    batch = []
+    with keep_timestamps(model):
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+
+def _new_ids(model, create):
+    """Run ``create`` and return the primary keys of the rows it added."""
+    last_pk = model.objects.order_by('-pk').values_list('pk', flat=True)
+    start = last_pk.first() or 0
+    create()
+    return list(
+        model.objects.filter(pk__gt=start).order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights of ranks ``1..count`` under Zipf's law.
+
+    ``skew=0`` gives a uniform distribution.
+    """
+    return list(itertools.accumulate(
+        1 / rank ** skew for rank in range(1, count + 1)
+    ))
+
+
+def seed(posts, authors=1000, groups=50, comments=0, follows=0, rng=None,
+         skew=1.0, days=30, burst_minutes=30):
+    """Insert synthetic users, groups, posts, comments and follows.
+
+    Posts are spread over the last ``days`` days in primary key order;
+    comments come ``burst_minutes`` after their post on average. Rows
+    are written with ``bulk_create`` in batches, so signals do not fire:
+    run rebuild_counters, reindex_search and backfill_timelines
+    afterwards.
+    """
+    rng = rng or random.Random()
+    run = int(time.time())
+
+    author_ids = _new_ids(User, lambda: _batched(
+        (
+            User(username=f'seed-{run}-{i}', password='!')
+            for i in range(authors)
+        ),
+        User,
+    ))
+    group_ids = _new_ids(Group, lambda: _batched(
+        (
+            Group(
+                title=f'Группа {i}',
+                slug=f'seed-{run}-{i}',
+                description='Сгенерированная группа',
+            )
+            for i in range(groups)
+        ),
+        Group,
+    ))
+
+    # A random author is the most active and the most followed one.
+    popular = rng.sample(author_ids, len(author_ids))
+    author_weights = zipf_weights(len(popular), skew)
+    group_weights = zipf_weights(len(group_ids), skew)
+    start = timezone.now() - datetime.timedelta(days=days)
+    step = datetime.timedelta(days=days) / max(posts, 1)
+    pub_dates = [start + step * i for i in range(posts)]
+
+    post_ids = _new_ids(Post, lambda: _batched(
+        (
+            Post(
+                author_id=rng.choices(popular, cum_weights=author_weights)[0],
+                group_id=(
+                    rng.choices(group_ids, cum_weights=group_weights)[0]
+                    if group_ids else None
+                ),
+                text=f'Сгенерированный пост {i}',
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+            for i, pub_date in enumerate(pub_dates)
+        ),
+        Post,
+    ))
+
+    hot = rng.sample(range(len(post_ids)), len(post_ids))
+    post_weights = zipf_weights(len(hot), skew)
+
+    def comment(i):
+        index = rng.choices(hot, cum_weights=post_weights)[0]
+        delay = rng.expovariate(1 / burst_minutes) if burst_minutes else 0
+        created = pub_dates[index] + datetime.timedelta(minutes=delay)
+        return Comment(
+            post_id=post_ids[index],
+            author_id=rng.choice(author_ids),
+            text=f'Сгенерированный комментарий {i}',
+            created=created,
+            updated=created,
+        )
+
+    _batched((comment(i) for i in range(comments if post_ids else 0)),
+             Comment)
+
+    pairs = set()
+    limit = min(follows, len(author_ids) * (len(author_ids) - 1))
+    for _ in range(limit * 3):
+        if len(pairs) == limit:
+            break
+        user = rng.choice(author_ids)
+        author = rng.choices(popular, cum_weights=author_weights)[0]
+        if user != author:
+            pairs.add((user, author))
+    _batched(
+        (Follow(user_id=user, author_id=author) for user, author in pairs),
+        Follow,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return author_ids, group_ids, post_ids
@@ -0,0 +1,217 @@
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from . import blobs, cards, counters, page_cache, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# User fields rendered on post cards.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+# Group fields rendered with posts.
+POST_GROUP_FIELDS = ('slug', 'title', 'description')
+
+
+def _group_fields(group):
+    return tuple(group.__dict__.get(field) for field in POST_GROUP_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_post(instance.post_id, comments_count=1)
+
+
+@receiver(post_save, sender=Comment)
+def touch_commented_post(sender, instance, created, raw=False, **kwargs):
+    # New comments already moved the post's ``updated`` with its count.
+    if not created and not raw:
+        counters.bump_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_card(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        cards.invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def refresh_author_cards(sender, instance, created, update_fields=None,
+                         raw=False, **kwargs):
+    if created or raw:
+        return
+    if update_fields is None or CARD_USER_FIELDS & set(update_fields):
+        cards.invalidate_author(instance.pk)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def purge_pages_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge_post(instance)
+        instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def purge_pages_on_delete(sender, instance, **kwargs):
+    page_cache.purge_post(instance)
+
+
+@receiver(post_init, sender=Group)
+def remember_group_fields(sender, instance, **kwargs):
+    instance._loaded_fields = _group_fields(instance)
+
+
+@receiver(post_save, sender=Group)
+def purge_group_page(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    page_cache.purge(page_cache.group_feed(instance.slug))
+    # Every feed, post page and card links the group of its posts.
+    if not created and instance._loaded_fields != _group_fields(instance):
+        page_cache.purge_all()
+        cards.invalidate_all()
+    instance._loaded_fields = _group_fields(instance)
+
+
+@receiver(post_delete, sender=Group)
+def purge_pages_on_group_delete(sender, instance, **kwargs):
+    # Posts leave the group without signals of their own.
+    page_cache.purge_all()
+
+
+@receiver(post_save, sender=Follow)
+def purge_follow_state(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        page_cache.purge(page_cache.follows_feed(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def purge_follow_state_on_delete(sender, instance, **kwargs):
+    page_cache.purge(page_cache.follows_feed(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def purge_pages_on_rename(sender, instance, created, update_fields=None,
+                          raw=False, **kwargs):
+    if created or raw:
+        return
+    if update_fields is None or CARD_USER_FIELDS & set(update_fields):
+        page_cache.purge_all()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or update_fields is not None and 'text' not in update_fields:
+        return
+    search.index(
+        search.post_document_id(instance.pk), instance.pk, instance.text
+    )
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove(search.post_document_id(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(
+            search.comment_document_id(instance.pk),
+            instance.post_id,
+            instance.text,
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove(search.comment_document_id(instance.pk))
+
+
+@receiver(post_init, sender=Post)
+def remember_post_image(sender, instance, **kwargs):
+    # A file passed to the constructor is an upload, not a stored image.
+    image = instance.__dict__.get('image')
+    instance._loaded_image = image if isinstance(image, str) else None
+
+
+@receiver(pre_save, sender=Post)
+def lock_new_image(sender, instance, raw=False, **kwargs):
+    # Before the field stores the file, which may reuse a stored one.
+    if raw or 'image' not in instance.__dict__:
+        return
+    image = instance.image
+    if image and image.name != instance._loaded_image:
+        blobs.lock(blobs.stored_name(image))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    loaded = instance._loaded_image
+    if loaded and loaded != instance.image.name:
+        blobs.release(loaded)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    blobs.release(instance.image.name)
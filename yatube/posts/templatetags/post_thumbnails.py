@@ -0,0 +1,29 @@
+from django import template
+
+from core import blurhash
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, size='card'):
+    """The rendered thumbnail of the post image, or ``None``.
+
+    Uses ``post.thumbnail`` when the page attached it in bulk. A missing
+    thumbnail is queued for rendering instead of being made while the
+    page waits.
+    """
+    if 'thumbnail' in post.__dict__:
+        thumbnail = post.thumbnail
+    else:
+        thumbnail = thumbnails.get_ready(post.image, size)
+    if thumbnail is None:
+        thumbnails.enqueue(post)
+    return thumbnail
+
+
+@register.filter
+def blurhash_color(value):
+    """The average color of a blurhash, for a placeholder background."""
+    return blurhash.average_color(value)
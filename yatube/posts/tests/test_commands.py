@@ -0,0 +1,164 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+from .. import benchmark, cards, page_cache, search
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+class ExplainFeedsCommandTests(TestCase):
+    def test_explain_feeds_seeds_and_compares_plans(self):
+        """explain_feeds seeds data and prints both sets of plans."""
+        out = StringIO()
+
+        call_command(
+            'explain_feeds',
+            seed_posts=50, seed_authors=5, seed_groups=2,
+            stdout=out,
+        )
+
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertIn('without indexes', out.getvalue())
+        self.assertIn('post_feed_idx', out.getvalue())
+
+
+class ReindexSearchCommandTests(TestCase):
+    def test_reindex_covers_existing_rows(self):
+        """reindex_search indexes rows written without signals."""
+        user = User.objects.create_user(username='Mark')
+        Post.objects.bulk_create([
+            Post(author=user, text=f'Импортированный пост {i}')
+            for i in range(3)
+        ])
+        self.assertEqual(search.search('импортированный'), [])
+
+        call_command('reindex_search', stdout=StringIO())
+
+        self.assertEqual(len(search.search('импортированный')), 3)
+
+
+class NdjsonCommandTests(TestCase):
+    def test_export_import_round_trip(self):
+        """Exported rows come back with their ids, links and dates."""
+        author = User.objects.create_user(username='Mark')
+        reader = User.objects.create_user(username='Reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        post = Post.objects.create(author=author, group=group, text='Пост')
+        Comment.objects.create(post=post, author=reader, text='Ответ')
+        Follow.objects.create(user=reader, author=author)
+        pub_date = Post.objects.get(pk=post.pk).pub_date
+        path = os.path.join(tempfile.mkdtemp(), 'site.ndjson.gz')
+
+        call_command('ndjson', 'export', path, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        out = StringIO()
+        call_command('ndjson', 'import', path, stdout=out)
+
+        imported = Post.objects.select_related('author__stats').get(
+            pk=post.pk
+        )
+        self.assertEqual(imported.pub_date, pub_date)
+        self.assertEqual(imported.group.slug, 'group')
+        self.assertEqual(imported.comments.get().author.username, 'Reader')
+        self.assertEqual(imported.comments_count, 1)
+        self.assertEqual(imported.author.stats.followers_count, 1)
+        self.assertTrue(Follow.objects.filter(author=author).exists())
+        self.assertIn('Imported 6 rows.', out.getvalue())
+        os.remove(path)
+
+    def test_import_purges_cached_pages_and_cards(self):
+        """Pages and cards cached before a restore are not served."""
+        author = User.objects.create_user(username='Mark')
+        post = Post.objects.create(author=author, text='Старый текст')
+        path = os.path.join(tempfile.mkdtemp(), 'site.ndjson')
+        call_command('ndjson', 'export', path, stdout=StringIO())
+        cards.render_cards([post])
+        stamps = page_cache.feed_stamps()
+        # Changed behind the signals' back, as a restore does.
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+
+        call_command(
+            'ndjson', 'import', path, '--ignore-conflicts',
+            stdout=StringIO(),
+        )
+
+        [(_, html)] = cards.render_cards([Post.objects.get(pk=post.pk)])
+        self.assertIn('Новый текст', html)
+        self.assertNotEqual(page_cache.feed_stamps(), stamps)
+        os.remove(path)
+
+
+class SeedDataCommandTests(TestCase):
+    def test_seeded_data_is_skewed(self):
+        """Activity and popularity concentrate on a few authors."""
+        call_command(
+            'seed_data', posts=400, authors=40, groups=4, comments=400,
+            follows=200, random_seed=1, stdout=StringIO(),
+        )
+
+        posts = list(
+            UserStats.objects.order_by('-posts_count')
+            .values_list('posts_count', flat=True)
+        )
+        self.assertEqual(sum(posts), 400)
+        self.assertGreater(posts[0], 5 * posts[len(posts) // 2])
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F('post__pub_date')).exists()
+        )
+        self.assertEqual(len(search.search('сгенерированный')), 50)
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_reports_and_compares(self):
+        """Every feed view is measured and compared with a baseline."""
+        call_command(
+            'seed_data', posts=30, authors=5, groups=2, comments=30,
+            follows=10, random_seed=1, stdout=StringIO(),
+        )
+
+        results = benchmark.run(requests=3, warmup=1)
+
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+        })
+        baseline = {
+            view: dict(metrics, queries=metrics['queries'] - 1)
+            for view, metrics in results.items()
+        }
+        regressed = {
+            (view, metric)
+            for view, metric, _, _, bad in benchmark.compare(
+                results, baseline
+            )
+            if bad
+        }
+        self.assertIn(('index', 'queries'), regressed)
+        self.assertNotIn(('index', 'p50_ms'), regressed)
+
+
+class ConcurrencyBenchmarkTests(TransactionTestCase):
+    # Committed rows, so the serving threads' connections see them.
+    def test_views_are_served_by_one_thread_and_by_a_pool(self):
+        """Every feed view is timed with one serving thread and a pool."""
+        call_command(
+            'seed_data', posts=10, authors=3, groups=1, comments=5,
+            follows=3, random_seed=1, stdout=StringIO(),
+        )
+
+        results = benchmark.concurrency(requests=4, threads=2, delay=0)
+
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+        })
+        for view, runs in results.items():
+            with self.subTest(view=view):
+                self.assertEqual(set(runs), {1, 2})
+                self.assertGreater(runs[2]['rps'], 0)
@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -7,6 +8,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Post, Group, Comment
 
@@ -135,8 +137,10 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 text='Новый пост',
                 author=self.user.pk,
-                image='posts/small.gif'
-            ).exists()
+                image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.webp$',
+                image_width=2,
+                image_height=1,
+            ).exclude(image_blurhash='').exists()
         )
 
     def test_valid_form_edites_post(self):
@@ -196,3 +200,52 @@ class PostFormTests(TestCase):
 
         self.assertEqual(Comment.objects.count(), comments_count)
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def jpeg(self, size):
+        image = Image.new('RGB', size, (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        output = io.BytesIO()
+        image.save(output, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(
+            'photo.jpg', output.getvalue(), content_type='image/jpeg'
+        )
+
+    def test_image_is_downscaled_and_stripped(self):
+        with override_settings(IMAGE_MAX_DIMENSION=100):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Фото', 'image': self.jpeg((400, 200))},
+            )
+
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertFalse(stored.getexif())
+
+    def test_oversized_upload_is_rejected(self):
+        with override_settings(UPLOAD_MAX_SIZE=100):
+            response = self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Большое фото', 'image': self.jpeg((64, 64))},
+            )
+
+        self.assertFalse(Post.objects.filter(text='Большое фото').exists())
+        self.assertTrue(response.context['form'].has_error('image'))
@@ -1,7 +1,21 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from .. import blobs
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats
+)
 
 User = get_user_model()
 
@@ -57,3 +71,192 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, example)
+
+    def test_foreign_keys_are_indexed_once(self):
+        """Keys leading a composite index get no index of their own."""
+        keys = {
+            Post: ['author_id', 'group_id'],
+            Comment: ['post_id'],
+            Follow: ['user_id', 'author_id'],
+            TimelineEntry: ['user_id'],
+        }
+        for model, columns in keys.items():
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                ).values()
+            for column in columns:
+                with self.subTest(model=model.__name__, column=column):
+                    leading = [
+                        constraint['columns'] for constraint in constraints
+                        if (constraint['index'] or constraint['unique'])
+                        and constraint['columns'][0] == column
+                    ]
+                    self.assertTrue(leading)
+                    self.assertNotIn([column], leading)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Counters change with posts, comments and follows."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+
+        post.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 0
+        )
+
+    def test_rebuild_counters_fixes_drift(self):
+        """rebuild_counters recounts drifted and missing rows."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {i}') for i in range(3)
+        ])
+        UserStats.objects.filter(user=self.reader).delete()
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3
+        )
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_rebuild_counters_writes_in_batches(self):
+        """Missing and drifted rows cost one statement per batch."""
+        posts = Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {i}') for i in range(3)
+        ])
+        for post in Post.objects.all():
+            Comment.objects.create(post=post, author=self.reader, text='!')
+        Post.objects.update(comments_count=5)
+        UserStats.objects.filter(user=self.reader).delete()
+        User.objects.bulk_create([User(username=f'new{i}') for i in range(3)])
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_counters', stdout=StringIO())
+
+        writes = [
+            query['sql'].split('"')[1]
+            for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE'))
+        ]
+        self.assertEqual(sorted(writes), [
+            'posts_post', 'posts_userstats', 'posts_userstats',
+        ])
+        self.assertEqual(UserStats.objects.count(), User.objects.count())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, len(posts)
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1}
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+@patch('posts.blobs.transaction.on_commit', lambda callback: callback())
+class ImageStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='meme')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, name, content=b'meme'):
+        post = Post(author=self.user, text=name)
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_identical_images_share_a_file_until_last_post_goes(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        storage = first.image.storage
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def test_uploads_and_collection_lock_the_file(self):
+        """Saving a new image and collecting it hold its name."""
+        post = Post(
+            author=self.user,
+            text='locked',
+            image=ContentFile(b'locked', name='locked.gif'),
+        )
+
+        with patch.object(blobs, 'lock', wraps=blobs.lock) as lock:
+            post.save()
+            post.delete()
+
+        self.assertEqual(
+            [call[0][0] for call in lock.call_args_list],
+            [post.image.name, post.image.name],
+        )
+        self.assertTrue(post.image.name.startswith('posts/'))
+
+    def test_replaced_image_is_collected(self):
+        post = self.create_post('old.gif')
+        old_name = post.image.name
+
+        post.image.save('new.gif', ContentFile(b'new meme'))
+
+        self.assertFalse(post.image.storage.exists(old_name))
+
+    def test_dedupe_media_merges_old_files(self):
+        storage = Post._meta.get_field('image').storage
+        posts = []
+        os.makedirs(storage.path('posts'), exist_ok=True)
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            with open(storage.path(name), 'wb') as legacy:
+                legacy.write(b'meme')
+            posts.append(
+                Post.objects.create(author=self.user, text=name, image=name)
+            )
+
+        call_command('dedupe_media', stdout=StringIO())
+
+        names = {
+            post.image.name
+            for post in Post.objects.filter(pk__in=[p.pk for p in posts])
+        }
+        self.assertEqual(len(names), 1)
+        self.assertTrue(storage.exists(names.pop()))
+        self.assertFalse(storage.exists('posts/a.gif'))
+        self.assertFalse(storage.exists('posts/b.gif'))
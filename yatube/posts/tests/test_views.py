@@ -1,15 +1,30 @@
+import base64
 import shutil
 import tempfile
+from http import HTTPStatus
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client, override_settings
+from django.db import connection, connections
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls.base import reverse
+from django.utils import timezone
 from django import forms
 
-from ..models import Comment, Follow, Group, Post
+from core.db.replicas import PIN_COOKIE
+from core.paginator import CursorPaginator
+
+from .. import cards, search, thumbnails, timeline, views
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats
+)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -84,6 +99,8 @@ class PostsURLTests(TestCase):
         self.follower_client = Client()
         self.follower_client.force_login(self.follower_user)
 
+        self.guest_client = Client()
+
     def test_pages_use_correct_template(self):
         """App's templates are correct."""
         templates = {
@@ -346,3 +363,876 @@ class PostsURLTests(TestCase):
         ))
 
         self.assertEqual(Follow.objects.count(), count_follow - 1)
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Cursor pages cover the feed without gaps or repeats."""
+        first_page = self.author_client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        second_page = self.author_client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+        ).context['page_obj']
+
+        self.assertEqual(first_page.previous_cursor, '')
+        self.assertEqual(second_page.next_cursor, '')
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(Post.objects.all()),
+        )
+
+        back_page = self.author_client.get(
+            reverse('posts:index') + f'?cursor={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_cursor_page_skips_count_query(self):
+        """Cursor pages are fetched without COUNT(*)."""
+        first_page = self.author_client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+            )
+
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_bad_cursor_returns_first_page(self):
+        """Malformed cursor falls back to the first page."""
+        response = self.author_client.get(
+            reverse('posts:index') + '?cursor=garbage'
+        )
+
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.all()[:10]),
+        )
+
+    def test_out_of_range_cursor_returns_first_page(self):
+        """Cursors with a key or a date a database cannot hold fall back
+        to the first page.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursors = {
+            'key': f'n|{timezone.now().isoformat()}|{"9" * 30}',
+            'date': 'n|9999-12-31T23:59:59-14:00|5',
+        }
+        for case, raw in cursors.items():
+            with self.subTest(case=case):
+                cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+                self.assertIsNone(paginator.decode_cursor(cursor))
+
+                response = self.author_client.get(
+                    reverse('posts:index'), {'cursor': cursor}
+                )
+
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    list(Post.objects.all()[:10]),
+                )
+
+    def test_post_edit_loads_post_once(self):
+        """The ownership check hands the loaded post to the view."""
+        post = Post.objects.filter(author=self.user).first()
+        url = reverse('posts:post_edit', kwargs={'post_id': post.pk})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author_client.get(url)
+
+        self.assertEqual(response.context['post'], post)
+        self.assertEqual(
+            len([
+                query for query in queries.captured_queries
+                if 'FROM "posts_post"' in query['sql']
+            ]),
+            1,
+        )
+
+    def test_post_edit_does_not_write_counters(self):
+        """Saving the edit form leaves the counters to their updates."""
+        post = Post.objects.filter(author=self.user).first()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.author_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                data={'text': 'Новый текст'},
+            )
+
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "posts_post" SET "text"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('comments_count', updates[0])
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Feed pages run a fixed number of queries whatever the posts."""
+    # Session and user lookups of an authenticated request included.
+    QUERY_BUDGET = {
+        'posts:index': 3,
+        'posts:group_posts': 4,
+        'posts:profile': 4,
+        'posts:follow_index': 5,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f'Author{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                author=author,
+                group=cls.group,
+                text=f'Тестовый пост {i}',
+            )
+        timeline.build(cls.reader.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_pages_stay_within_query_budget(self):
+        """Feed pages do not issue a query per post."""
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_posts': reverse(
+                'posts:group_posts',
+                kwargs={'slug': self.group.slug}
+            ),
+            'posts:profile': reverse(
+                'posts:profile',
+                kwargs={'username': 'Author0'}
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+        for view_name, url in urls.items():
+            with self.subTest(view_name=view_name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.reader_client.get(url)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), self.QUERY_BUDGET[view_name],
+                    '\n'.join(q['sql'] for q in queries.captured_queries)
+                )
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.star = User.objects.create_user(username='Star')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_is_fanned_out(self):
+        """A new post lands in a built timeline of a follower."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get_feed(), [])
+
+        post = Post.objects.create(author=self.author, text='Новый пост')
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_follow_and_unfollow_update_timeline(self):
+        """Following backfills the timeline, unfollowing trims it."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        self.get_feed()
+
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.get_feed(), [post])
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_is_pulled_on_read(self):
+        """Posts of authors above the fan-out limit are pulled on read."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.get_feed()
+        post = Post.objects.create(author=self.star, text='Популярный пост')
+
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_pages_are_read_from_timeline_entries(self):
+        """Feed pages walk the entries by date without joining posts."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(views.POSTS_PER_PAGE + 2)
+        ]
+        self.get_feed()
+        # Identical dates are told apart by the post.
+        TimelineEntry.objects.update(pub_date=posts[0].pub_date)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(reverse('posts:follow_index'))
+        next_page = self.reader_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': response.context['page_obj'].next_cursor},
+        )
+
+        self.assertEqual(
+            list(response.context['page_obj'])
+            + list(next_page.context['page_obj']),
+            posts[::-1],
+        )
+        for query in queries.captured_queries:
+            if 'posts_timelineentry' in query['sql']:
+                self.assertNotIn('posts_post', query['sql'])
+
+    @override_settings(FEED_TIMELINE_LENGTH=12)
+    def test_timeline_is_capped_and_older_pages_read_posts(self):
+        """Only the newest posts are copied; the feed goes on past them.
+        """
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(15)
+        ]
+        self.get_feed()
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        first = self.reader_client.get(reverse('posts:follow_index'))
+        second = self.reader_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': first.context['page_obj'].next_cursor},
+        )
+
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 11
+        )
+        self.assertEqual(
+            list(first.context['page_obj'])
+            + list(second.context['page_obj']),
+            posts[::-1],
+        )
+        self.assertEqual(second.context['page_obj'].next_cursor, '')
+
+    def test_build_keeps_authors_without_stats(self):
+        """Authors without a counters row are not dropped from the feed."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).delete()
+
+        self.assertEqual(self.get_feed(), [post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_pulled_posts_are_pushed_when_author_falls_back(self):
+        """Posts of an author back under the limit reach every timeline.
+        """
+        Follow.objects.create(user=self.reader, author=self.star)
+        follow = Follow.objects.create(user=self.author, author=self.star)
+        self.get_feed()
+        post = Post.objects.create(author=self.star, text='Популярный пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+        follow.delete()
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.post = Post.objects.create(author=cls.user, text='Старый текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def render_card(self):
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        return cards.render_cards([post])[0][1]
+
+    def test_card_is_served_from_cache(self):
+        """A rendered card is reused until its post changes."""
+        self.render_card()
+
+        with patch.object(
+            cards, 'render_to_string', side_effect=AssertionError
+        ):
+            self.assertIn('Старый текст', self.render_card())
+
+    def test_card_refreshes_after_post_edit(self):
+        """Editing a post invalidates its card."""
+        self.render_card()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+
+        self.assertIn('Новый текст', self.render_card())
+
+    def test_card_refreshes_after_author_rename(self):
+        """Renaming the author invalidates the author's cards."""
+        self.render_card()
+        self.user.first_name = 'Марк'
+        self.user.save()
+
+        self.assertIn('Марк', self.render_card())
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Первый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+        )
+
+    def test_anonymous_pages_are_cached(self):
+        """Second anonymous request is a cache hit without queries."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+
+                self.assertEqual(first['X-Cache'], 'MISS')
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(first.content, second.content)
+                self.assertIn('Cookie', second['Vary'])
+
+    def test_authenticated_requests_bypass_cache(self):
+        """Authenticated users never get the anonymous page."""
+        self.guest_client.get(self.urls[0])
+
+        response = self.author_client.get(self.urls[0])
+
+        self.assertEqual(response['X-Cache'], 'BYPASS')
+
+    def test_post_changes_purge_feeds(self):
+        """Creating, editing and deleting a post purge its feeds."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Второй пост'
+        )
+        for url in self.urls:
+            self.guest_client.get(url)
+
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertContains(response, 'Исправленный пост')
+
+        post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertNotContains(response, 'Исправленный пост')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Первый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        # The first page with a form sets the CSRF cookie.
+        self.client.get(self.urls[-1])
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+
+    def test_unchanged_pages_are_not_modified(self):
+        """A matching validator gets an empty 304 without a render."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+
+                with self.assertTemplateNotUsed('base.html'):
+                    again = self.revalidate(url, response)
+
+                self.assertEqual(again.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(again.content, b'')
+
+    def test_pages_change_with_group_slug(self):
+        """Renaming a group changes the pages linking to it."""
+        group_url = self.urls[1]
+        responses = {
+            url: self.client.get(url) for url in self.urls if url != group_url
+        }
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, HTTPStatus.OK)
+                # The index keeps its own 20 second fragment cache.
+                if url != self.urls[0]:
+                    self.assertContains(again, '/group/new-slug/')
+
+    def test_pages_change_with_posts_and_comments(self):
+        """Edits and comments change the validators of their pages."""
+        responses = {url: self.client.get(url) for url in self.urls}
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, HTTPStatus.OK)
+                self.assertNotEqual(again['ETag'], response['ETag'])
+
+    def test_comment_changes_detail_page(self):
+        """A new comment alone changes the post page validator."""
+        url = self.urls[-1]
+        response = self.client.get(url)
+
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+
+        self.assertContains(self.revalidate(url, response), 'Комментарий')
+
+    def test_validators_differ_per_visitor(self):
+        """A validator of one visitor does not match another's page."""
+        response = self.client.get(self.urls[0])
+
+        again = self.revalidate(self.urls[0], response, Client())
+
+        self.assertEqual(again.status_code, HTTPStatus.OK)
+
+    def test_follow_changes_profile_page(self):
+        """Following the author changes the profile validator."""
+        url = self.urls[2]
+        response = self.client.get(url)
+
+        Follow.objects.create(user=self.reader, author=self.user)
+
+        again = self.revalidate(url, response)
+        self.assertEqual(again.status_code, HTTPStatus.OK)
+        self.assertTrue(again.context['following'])
+
+    def test_missing_post_is_not_found(self):
+        """A post that does not exist is never answered with 304."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+            HTTP_IF_NONE_MATCH='*',
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaPinningTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_forms_pin_the_visitor_to_the_primary(self):
+        """Creating a post or a comment keeps the redirect on the primary.
+        """
+        requests = {
+            'post_create': (reverse('posts:post_create'), {'text': 'Новый'}),
+            'add_comment': (
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                {'text': 'Комментарий'},
+            ),
+        }
+        for name, (url, data) in requests.items():
+            with self.subTest(view=name):
+                response = self.client.post(url, data)
+                self.assertEqual(response.status_code, 302)
+                self.assertIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=['lagging'])
+class LaggingReplicaTests(TransactionTestCase):
+    """Reads from a second test database holding an older copy of the
+    rows, as a replica that has not caught up yet.
+    """
+    # Reads inside a transaction stay on the primary.
+    databases = {'default', 'lagging'}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases['lagging'] = dict(
+            connections['default'].settings_dict, TEST={}
+        )
+        cls.lagging_name = connections['lagging'].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['lagging'].creation.destroy_test_db(
+            cls.lagging_name, verbosity=0
+        )
+        del connections['lagging']
+        del connections.databases['lagging']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Mark')
+        self.post = Post.objects.create(author=self.user, text='Новый текст')
+        User.objects.using('lagging').bulk_create([User(
+            pk=self.user.pk,
+            username=self.user.username,
+            password=self.user.password,
+        )])
+        Post.objects.using('lagging').bulk_create([Post(
+            pk=self.post.pk, author_id=self.user.pk, text='Старый текст'
+        )])
+        self.reader_client = Client()
+        self.reader_client.force_login(self.user)
+
+    def test_replica_reads_fill_no_caches(self):
+        """Cards, users and validators are not taken from the replica.
+        """
+        response = self.reader_client.get(reverse('posts:index'))
+        [(_, card)] = cards.render_cards(
+            [Post.objects.for_feed().get(pk=self.post.pk)]
+        )
+
+        self.assertContains(response, 'Старый текст')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('Новый текст', card)
+        with patch.object(
+            ModelBackend, 'get_user', return_value=None
+        ) as get_user:
+            self.reader_client.get(reverse('posts:index'))
+        get_user.assert_called_once()
+
+    def test_missed_pages_are_rendered_from_primary(self):
+        """Anonymous pages are cached as the primary has them."""
+        response = self.client.get(reverse('posts:index'))
+        cached = self.client.get(reverse('posts:index'))
+
+        self.assertContains(response, 'Новый текст')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertContains(cached, 'Новый текст')
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.post = Post.objects.create(author=cls.user, text='Популярный')
+        authors = [
+            User.objects.create_user(username=f'reader{i}') for i in range(5)
+        ]
+        for i in range(views.COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=authors[i % 5], text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def test_first_page_is_inline(self):
+        """Post page renders the oldest comments with one query."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments),
+            list(self.post.comments.all()[:views.COMMENTS_PER_PAGE]),
+        )
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertContains(response, comments.next_cursor)
+
+    def test_later_pages_are_fragments(self):
+        """The fragment endpoint continues the thread where it stopped."""
+        first_page = self.client.get(self.url).context['comments']
+
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'cursor': first_page.next_cursor},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            list(first_page) + list(response.context['comments']),
+            list(self.post.comments.all()),
+        )
+        self.assertEqual(response.context['comments'].next_cursor, '')
+
+    def test_missing_post_has_no_thread(self):
+        """Comments of a missing post are a 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 1,))
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Рецепт борща со свёклой'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user, text='Про котов <script>alert(1)</script>'
+        )
+        Comment.objects.create(
+            post=cls.other_post, author=cls.user, text='Борщ тоже люблю'
+        )
+
+    def find(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return response, [post for post, _ in response.context['results']]
+
+    def test_search_matches_posts_and_comments(self):
+        """Posts are found by their text and by their comments."""
+        response, posts = self.find('борщ')
+
+        self.assertEqual(set(posts), {self.post, self.other_post})
+        self.assertContains(response, 'Рецепт <mark>борща</mark>')
+
+    def test_snippets_are_escaped(self):
+        """Highlighted snippets never carry markup from the text."""
+        response, posts = self.find('котов')
+
+        self.assertEqual(posts, [self.other_post])
+        self.assertNotContains(response, '<script>alert(1)</script>')
+        self.assertContains(response, '&lt;script&gt;')
+
+    def test_index_follows_edits_and_deletes(self):
+        """Edited and deleted texts leave the index."""
+        post = Post.objects.create(author=self.user, text='Старый текст')
+        post.text = 'Новый текст'
+        post.save()
+
+        self.assertEqual(self.find('старый')[1], [])
+        self.assertEqual(self.find('новый')[1], [post])
+
+        post.delete()
+        self.assertEqual(self.find('новый')[1], [])
+
+    def test_falls_back_without_full_text_index(self):
+        """Without FTS5 posts are still found, by a plain scan."""
+        with patch.object(search, 'is_supported', return_value=False):
+            response, posts = self.find('котов')
+
+        self.assertEqual(posts, [self.other_post])
+        self.assertNotContains(response, '<mark>')
+
+    def test_falls_back_without_search_table(self):
+        """Databases migrated without the table save and find posts."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {search.TABLE}')
+        with patch.dict(search._tables, clear=True):
+            post = Post.objects.create(author=self.user, text='Про котов')
+            response, posts = self.find('котов')
+
+        self.assertEqual(set(posts), {self.other_post, post})
+        self.assertNotContains(response, '<mark>')
+
+    def test_empty_query(self):
+        """Search page without a query lists nothing."""
+        response = self.client.get(reverse('posts:search'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['results'], [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Mark')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.uploaded = SimpleUploadedFile(
+            name='thumb.gif', content=small_gif, content_type='image/gif'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост с картинкой', image=cls.uploaded
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Pages never render thumbnails themselves."""
+        with patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.client.get(self.url)
+
+        self.assertContains(response, 'img/thumbnail-placeholder.svg')
+        enqueue.assert_called_once()
+        self.assertIsNone(thumbnails.get_ready(self.post.image))
+
+    def test_ready_thumbnail_is_shown(self):
+        """Once rendered, the thumbnail replaces the placeholder."""
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.get_ready(self.post.image)
+
+        response = self.client.get(self.url)
+
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'img/thumbnail-placeholder.svg')
+
+    def test_feed_reads_thumbnails_in_one_batch(self):
+        """A feed page resolves all its thumbnails with one query."""
+        thumbnails.generate(self.post.image.name)
+        for i in range(3):
+            self.uploaded.seek(0)
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {i}', image=self.uploaded
+            )
+            thumbnails.generate(post.image.name)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+
+        thumbnail_queries = [
+            query for query in queries.captured_queries
+            if 'posts_thumbnail' in query['sql']
+        ]
+        self.assertEqual(len(thumbnail_queries), 1)
+        self.assertNotContains(response, 'img/thumbnail-placeholder.svg')
+
+    def test_new_image_is_queued(self):
+        """Creating a post with an image queues its thumbnails."""
+        self.client.force_login(self.user)
+        self.uploaded.seek(0)
+
+        with patch.object(thumbnails, 'enqueue') as enqueue:
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'image': self.uploaded},
+            )
+
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args[0][0].text, 'Новый пост')
+        post = Post.objects.get(text='Новый пост')
+        self.assertIsNone(thumbnails.get_ready(post.image))
+
+    def test_failed_image_is_not_queued_again(self):
+        """An image that failed to render stays out of the queue."""
+        name = self.post.image.name
+        with patch.object(
+            thumbnails, 'generate', side_effect=thumbnails.RenderError
+        ), self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails._run(name)
+
+        with patch.object(thumbnails, '_start_workers') as start, \
+                patch('posts.thumbnails.transaction.on_commit',
+                      lambda callback: callback()):
+            thumbnails.enqueue(self.post)
+
+        start.assert_not_called()
+        self.assertNotIn(name, thumbnails._pending)
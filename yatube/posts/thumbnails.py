@@ -0,0 +1,249 @@
+"""Thumbnails of post images, kept off the page rendering path.
+
+Every size listed in ``SIZES`` is rendered by a small pool of worker
+threads: saving a post with a new image queues it once the transaction
+commits, and templates only read thumbnails that already exist, show a
+placeholder otherwise and queue the missing ones. No request waits on
+Pillow. The generate_thumbnails command fills in thumbnails missing for
+older posts. Identical images are stored under one content-addressed
+name, so they share their thumbnails as well.
+
+Workers render through sorl's ``get_thumbnail`` and record the result
+as a ``Thumbnail`` row, which pages read through the cache, so nothing
+here depends on how sorl names or stores its files. An image that fails
+to render is not queued again for ``FAILURE_TIMEOUT`` seconds.
+"""
+import hashlib
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+from core.db.replicas import is_replica
+from core.profiling import timed
+
+from . import page_cache
+from .models import Post, Thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Every geometry and option set the templates render post images with.
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Seconds a missing thumbnail is remembered as missing, and a failed
+# image as failed.
+MISSING_TIMEOUT = 60
+FAILURE_TIMEOUT = 60 * 60
+
+_queue = queue.Queue()
+_pending = set()
+_workers = []
+_workers_lock = threading.Lock()
+
+QUEUE_DEPTH = metrics.Gauge(
+    'yatube_thumbnail_queue_depth',
+    'Post images waiting for their thumbnails.',
+)
+metrics.register_collector(lambda: QUEUE_DEPTH.set(_queue.qsize()))
+
+
+class RenderError(Exception):
+    pass
+
+
+def _digest(name):
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def _key(name, size):
+    return f'posts:thumbnail:{size}:{_digest(name)}'
+
+
+def _failed_key(name):
+    return f'posts:thumbnail:failed:{_digest(name)}'
+
+
+def source(image):
+    """``image``, a field file or a name, as a sorl image file read
+    through the storage of ``Post.image``.
+    """
+    return ImageFile(
+        getattr(image, 'name', image), Post._meta.get_field('image').storage
+    )
+
+
+def _image_file(record):
+    name, width, height = record
+    thumbnail = ImageFile(name, default.storage)
+    thumbnail.set_size((width, height))
+    return thumbnail
+
+
+def _read(names, size):
+    """Recorded thumbnails of ``names`` at ``size``: one cache
+    ``get_many``, one query for the names the cache does not know.
+    Thumbnails a replica does not have yet are not remembered missing.
+    """
+    keys = {name: _key(name, size) for name in names}
+    found = cache.get_many(keys.values())
+    missing = [name for name, key in keys.items() if key not in found]
+    if missing:
+        rows = Thumbnail.objects.filter(image__in=missing, size=size)
+        rows = rows.using(rows.db)
+        stored = {
+            image: (name, width, height)
+            for image, name, width, height in rows.values_list(
+                'image', 'name', 'width', 'height'
+            )
+        }
+        cache.set_many(
+            {keys[name]: stored[name] for name in stored}, None
+        )
+        if not is_replica(rows.db):
+            cache.set_many(
+                {keys[name]: () for name in missing if name not in stored},
+                MISSING_TIMEOUT,
+            )
+        found.update({keys[name]: stored[name] for name in stored})
+    return {
+        name: _image_file(found[key])
+        for name, key in keys.items()
+        if found.get(key)
+    }
+
+
+def get_ready(image, size='card'):
+    """The thumbnail of ``image`` if it was rendered, ``None`` otherwise.
+    """
+    if not image:
+        return None
+    name = getattr(image, 'name', image)
+    with timed('thumbnail'):
+        return _read([name], size).get(name)
+
+
+def attach(posts, size='card'):
+    """Set ``post.thumbnail`` to the rendered thumbnail or ``None``.
+
+    All posts are resolved with one batched read instead of one lookup
+    per post.
+    """
+    posts = [post for post in posts if 'thumbnail' not in post.__dict__]
+    names = {post.image.name for post in posts if post.image}
+    with timed('thumbnail'):
+        ready = _read(names, size) if names else {}
+    for post in posts:
+        post.thumbnail = ready.get(post.image.name) if post.image else None
+
+
+def generate(name):
+    """Render and record every size of the image stored under ``name``,
+    unless it was deleted while the job waited.
+    """
+    source_file = source(name)
+    if not source_file.exists():
+        return
+    for size, (geometry, options) in SIZES.items():
+        thumbnail = get_thumbnail(source_file, geometry, **options)
+        # sorl logs decoding errors and hands back a file never written.
+        if not thumbnail.exists():
+            raise RenderError(f'{name} could not be rendered at {size}.')
+        Thumbnail.objects.update_or_create(
+            image=name,
+            size=size,
+            defaults={
+                'name': thumbnail.name,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+            },
+        )
+        cache.set(
+            _key(name, size),
+            (thumbnail.name, thumbnail.width, thumbnail.height),
+            None,
+        )
+
+
+def forget(name):
+    """Drop the records of the thumbnails of ``name``, once deleted."""
+    Thumbnail.objects.filter(image=name).delete()
+    cache.delete_many([_key(name, size) for size in SIZES])
+
+
+def fail(name):
+    """Keep ``name`` out of the queue for ``FAILURE_TIMEOUT`` seconds."""
+    cache.set(_failed_key(name), True, FAILURE_TIMEOUT)
+
+
+def refresh(name):
+    """Drop cached pages of posts with the image ``name``, which show
+    the placeholder, and its cached lookups, which may have been made
+    by another process.
+    """
+    cache.delete_many([_key(name, size) for size in SIZES])
+    posts = Post.objects.filter(image=name)
+    posts.update(updated=timezone.now())
+    for post in posts.only('group_id'):
+        page_cache.purge_post(post)
+
+
+def _run(name):
+    try:
+        generate(name)
+        refresh(name)
+    except Exception:
+        logger.exception('Failed to render thumbnails of %s', name)
+        fail(name)
+
+
+def _work():
+    while True:
+        name = _queue.get()
+        try:
+            _run(name)
+        finally:
+            with _workers_lock:
+                _pending.discard(name)
+            close_old_connections()
+            _queue.task_done()
+
+
+def _start_workers():
+    with _workers_lock:
+        while len(_workers) < settings.THUMBNAIL_WORKERS:
+            worker = threading.Thread(
+                target=_work, name='thumbnails', daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+
+
+def enqueue(post):
+    """Queue the post image for rendering once the transaction commits.
+
+    Posts sharing an image share one job; images that failed recently
+    are skipped.
+    """
+    if not post.image:
+        return
+    name = post.image.name
+
+    def put():
+        if cache.get(_failed_key(name)):
+            return
+        _start_workers()
+        with _workers_lock:
+            if name in _pending:
+                return
+            _pending.add(name)
+        _queue.put(name)
+
+    transaction.on_commit(put)
@@ -0,0 +1,223 @@
+"""Materialized follow feeds.
+
+New posts are written into the TimelineEntry rows of every follower
+whose timeline is built, together with their publication date, so a
+page of the follow feed is an index range scan on
+``(user, pub_date, post)`` and one lookup of its posts by primary key.
+Authors followed by more than ``FEED_FANOUT_LIMIT`` users are skipped on
+write: their new posts are pulled into a timeline when it is read, and
+pushed to every built timeline once the author falls back under the
+limit. Timelines are built lazily on first read.
+
+Building a timeline or following an author copies at most
+``FEED_TIMELINE_LENGTH`` posts. A timeline holds every followed post
+newer than its horizon; pages past the horizon, or past the last entry,
+are read from the posts of the followed authors instead.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from core.paginator import paginate
+
+from .models import Follow, Post, TimelineEntry, TimelineState, UserStats
+
+BATCH_SIZE = 1000
+# Posts are dated before their transaction commits: pulls look this
+# far behind the newest post pulled so far.
+PULL_LAG = timedelta(minutes=5)
+
+
+def _is_pulled(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def _insert(user_ids, posts):
+    """Write ``posts``, pairs of pk and pub_date, into the timelines."""
+    entries = (
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+    # Django 2.2 lets an explicit batch_size exceed the backend limit.
+    batch_size = min(BATCH_SIZE, connection.ops.bulk_batch_size(
+        ['user_id', 'post_id', 'pub_date'], []
+    ))
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=batch_size, ignore_conflicts=True
+    )
+
+
+def _latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def _since(pulled):
+    return None if pulled is None else pulled - PULL_LAG
+
+
+def _posts(since=None, **filters):
+    posts = Post.objects.filter(**filters)
+    if since is not None:
+        posts = posts.filter(pub_date__gt=since)
+    return posts.values_list('pk', 'pub_date')
+
+
+def _trim(user_ids, horizon):
+    """Move the horizon of the timelines up to ``horizon``."""
+    TimelineState.objects.filter(user_id__in=user_ids).filter(
+        Q(horizon__isnull=True) | Q(horizon__lt=horizon)
+    ).update(horizon=horizon)
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lte=horizon
+    ).delete()
+
+
+def _copy(user_ids, posts):
+    """Write the newest ``FEED_TIMELINE_LENGTH`` of ``posts`` into the
+    timelines, trimming them to the oldest post written if some were
+    left out. Returns the written pairs of pk and pub_date.
+    """
+    length = settings.FEED_TIMELINE_LENGTH
+    posts = list(posts.order_by('-pub_date', '-pk')[:length])
+    _insert(user_ids, posts)
+    if len(posts) == length:
+        _trim(user_ids, posts[-1][1])
+    return posts
+
+
+def fan_out(post):
+    """Push a new post into its author's followers' timelines."""
+    if _is_pulled(post.author_id):
+        return
+    readers = Follow.objects.filter(
+        author_id=post.author_id,
+        user__timeline_state__isnull=False,
+    ).values_list('user_id', flat=True)
+    _insert(readers.iterator(), [(post.pk, post.pub_date)])
+
+
+def follow(user_id, author_id):
+    """Backfill the author's posts above the horizon after the user
+    follows them.
+
+    Posts of popular authors are backfilled too: only their new posts
+    are pulled on read.
+    """
+    state = TimelineState.objects.filter(user_id=user_id).first()
+    if state is None:
+        return
+    _copy([user_id], _posts(state.horizon, author_id=author_id))
+
+
+def unfollow(user_id, author_id):
+    """Drop the author's posts after the user unfollows them, and push
+    the author's pulled posts if they fell back under the limit.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+    # signals.count_deleted_follow has already counted this unfollow.
+    if UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_FANOUT_LIMIT,
+    ).exists():
+        push(author_id)
+
+
+def push(author_id):
+    """Write the posts published while the author was pulled into every
+    built timeline of their followers that has not pulled them yet.
+    """
+    readers = list(Follow.objects.filter(
+        author_id=author_id,
+        user__timeline_state__isnull=False,
+    ).values_list('user_id', 'user__timeline_state__pulled'))
+    if not readers:
+        return
+    if any(pulled is None for _, pulled in readers):
+        since = None
+    else:
+        since = _since(min(pulled for _, pulled in readers))
+    _copy(
+        [user_id for user_id, _ in readers],
+        _posts(since, author_id=author_id),
+    )
+
+
+def pull(user):
+    """Copy the new posts of popular authors the user follows into their
+    built timeline. Reads without news write nothing.
+    """
+    authors = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    if not authors:
+        return
+    state = TimelineState.objects.filter(user=user).first()
+    if state is None:
+        return
+    posts = _posts(
+        _latest(_since(state.pulled), state.horizon), author_id__in=authors
+    ).exclude(timeline_entries__user=user)
+    if not posts.exists():
+        return
+    with transaction.atomic():
+        newest = _copy([user.pk], posts)[0][1]
+        TimelineState.objects.filter(user=user).update(
+            pulled=_latest(newest, state.pulled)
+        )
+
+
+@transaction.atomic
+def build(user_id):
+    """Rebuild the user's timeline from the follow graph."""
+    pulled = timezone.now()
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    TimelineState.objects.update_or_create(
+        user_id=user_id, defaults={'pulled': pulled, 'horizon': None}
+    )
+    _copy([user_id], _posts(author__following__user_id=user_id))
+
+
+def page(request, user, per_page):
+    """The requested page of the user's follow feed, its posts ready for
+    the feed. The timeline is built on first read.
+    """
+    pull(user)
+    horizon = TimelineState.objects.filter(user=user).values('horizon')
+    entries = (
+        TimelineEntry.objects.filter(user=user)
+        .annotate(horizon=Subquery(horizon))
+        .filter(Q(horizon__isnull=True) | Q(pub_date__gt=F('horizon')))
+        .only('post', 'pub_date')
+    )
+    page_obj = paginate(request, entries, per_page, key='post_id')
+    if not page_obj.object_list and not TimelineState.objects.filter(
+        user=user
+    ).exists():
+        build(user.pk)
+        page_obj = paginate(request, entries, per_page, key='post_id')
+    rows = list(page_obj.object_list)
+    if len(rows) < per_page and (not rows or rows[0].horizon is not None):
+        # Past the horizon: the posts themselves tell what is older.
+        return paginate(
+            request,
+            Post.objects.filter(author__following__user=user).for_feed(),
+            per_page,
+        )
+    post_ids = [entry.post_id for entry in rows]
+    posts = Post.objects.for_feed().in_bulk(post_ids)
+    page_obj.object_list = [
+        posts[post_id] for post_id in post_ids if post_id in posts
+    ]
+    return page_obj
@@ -0,0 +1,178 @@
+"""Streaming NDJSON export and import of site data.
+
+Every line is one row, ``{"model": "posts.post", "pk": 1, "fields":
+{...}}``, with foreign keys stored as raw ids. Models are written parents
+first, so an import inserts them in the same order with their original
+primary keys and every foreign key resolves to a row already loaded.
+Rows are read and written in batches, so memory use does not grow with
+the size of the data.
+"""
+import datetime
+import json
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+# Parents before children.
+MODELS = (User, Group, Post, Comment, Follow)
+
+
+class Encoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder rounds away."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+
+
+class Throughput:
+    """Rows and elapsed seconds per model, in the order first seen."""
+
+    def __init__(self):
+        self.rows = {}
+        self.seconds = {}
+
+    def add(self, label, rows, seconds):
+        self.rows[label] = self.rows.get(label, 0) + rows
+        self.seconds[label] = self.seconds.get(label, 0.0) + seconds
+
+    def lines(self):
+        for label, rows in self.rows.items():
+            seconds = self.seconds[label]
+            rate = rows / seconds if seconds else rows
+            yield f'{label}: {rows} rows in {seconds:.1f}s ({rate:.0f}/s)'
+
+
+def dump(stream, models=MODELS, progress=None):
+    """Write the rows of ``models`` to the text ``stream``."""
+    throughput = Throughput()
+    encoder = Encoder(ensure_ascii=False)
+    for model in models:
+        label = _label(model)
+        names = [field.attname for field in _fields(model)]
+        rows = model.objects.order_by('pk').values_list('pk', *names)
+        started = time.monotonic()
+        written = 0
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            stream.write(encoder.encode({
+                'model': label,
+                'pk': row[0],
+                'fields': dict(zip(names, row[1:])),
+            }))
+            stream.write('\n')
+            written += 1
+            if progress and written % (BATCH_SIZE * 20) == 0:
+                progress(label, written)
+        throughput.add(label, written, time.monotonic() - started)
+    return throughput
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Let imported rows keep their ``auto_now_add`` and ``auto_now``
+    timestamps.
+    """
+    fields = [
+        (field, field.auto_now_add, field.auto_now)
+        for field in _fields(model)
+        if getattr(field, 'auto_now_add', False)
+        or getattr(field, 'auto_now', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now_add = field.auto_now = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add, auto_now in fields:
+            field.auto_now_add = auto_now_add
+            field.auto_now = auto_now
+
+
+def _build(model, fields, record):
+    values = record['fields']
+    obj = model(pk=record['pk'])
+    for field in fields:
+        if field.attname in values:
+            setattr(
+                obj, field.attname, field.to_python(values[field.attname])
+            )
+        elif getattr(field, 'auto_now', False):
+            # Dumps made before the field existed.
+            setattr(obj, field.attname, timezone.now())
+    return obj
+
+
+def _records(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _reset_sequences(models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def load(stream, ignore_conflicts=False, progress=None):
+    """Insert the rows of the NDJSON ``stream`` with ``bulk_create``.
+
+    Lines of a model are expected together, as ``dump`` writes them.
+    Primary key sequences are moved past the imported ids afterwards.
+    """
+    throughput = Throughput()
+    loaded = []
+    model = fields = None
+    batch = []
+    started = time.monotonic()
+
+    def flush():
+        nonlocal started
+        if not batch:
+            return
+        with keep_timestamps(model):
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts
+            )
+        label = _label(model)
+        throughput.add(label, len(batch), time.monotonic() - started)
+        if progress and throughput.rows[label] % (BATCH_SIZE * 20) == 0:
+            progress(label, throughput.rows[label])
+        batch.clear()
+        started = time.monotonic()
+
+    for record in _records(stream):
+        if model is None or record['model'] != _label(model):
+            flush()
+            model = apps.get_model(record['model'])
+            if model not in MODELS:
+                raise ValueError(f'Unexpected model {record["model"]}.')
+            fields = _fields(model)
+            loaded.append(model)
+        batch.append(_build(model, fields, record))
+        if len(batch) == BATCH_SIZE:
+            flush()
+    flush()
+    _reset_sequences(loaded)
+    return throughput
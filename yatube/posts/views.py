@@ -1,22 +1,45 @@
 from django.shortcuts import get_object_or_404, render, redirect
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.views.decorators.http import require_GET, require_http_methods
 
-from .models import Follow, Group, Post, User
+from core.db.replicas import replica_reads
+from core.paginator import CursorPaginator, paginate
+
+from .models import Comment, Follow, Group, Post, User
 from .forms import PostForm, CommentForm
-from .decorators import user_is_author
+from .decorators import (
+    cache_anonymous_page, conditional_page, user_is_author
+)
+from . import conditional, page_cache, thumbnails, timeline
+from .search import search as search_posts
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+def comment_page(post_id, cursor=None):
+    """A page of the post's comments, oldest first, authors joined."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, field='created', descending=False
+    )
+    return paginator.get_page(cursor)
 
 
 @require_GET
+@replica_reads
+@conditional_page(conditional.index)
+@cache_anonymous_page(page_cache.index_feed)
 def index(request):
     """The index function submit 10 posts ordered by date to index.html template.
     """
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = paginate(request, posts, POSTS_PER_PAGE)
     context = {
         'page_obj': page_obj
     }
@@ -24,6 +47,9 @@ def index(request):
 
 
 @require_GET
+@replica_reads
+@conditional_page(conditional.group_posts)
+@cache_anonymous_page(page_cache.group_feed)
 def group_posts(request, slug):
     """The group_post function submit 10 posts of a group
     ordered by date to the group page.
@@ -31,11 +57,9 @@ def group_posts(request, slug):
     """
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
 
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts, POSTS_PER_PAGE)
     context = {
         'page_obj': page_obj
     }
@@ -43,18 +67,21 @@ def group_posts(request, slug):
 
 
 @require_GET
+@replica_reads
+@conditional_page(conditional.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
     user = request.user
-    following = False
-
+    # Counters and the follow state come with the author in one query.
+    authors = User.objects.select_related('stats')
     if user.is_authenticated:
-        following = author.following.filter(user=user).exists()
+        authors = authors.annotate(followed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+    author = get_object_or_404(authors, username=username)
+    following = getattr(author, 'followed', False)
 
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = author.posts.for_feed()
+    page_obj = paginate(request, posts, POSTS_PER_PAGE)
 
     template = 'posts/profile.html'
     context = {
@@ -66,10 +93,15 @@ def profile(request, username):
 
 
 @require_GET
+@replica_reads
+@conditional_page(conditional.post_detail)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id,
+    )
 
-    comments = post.comments.all()
+    comments = comment_page(post.pk)
 
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
@@ -81,8 +113,37 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@require_GET
+def post_comments(request, post_id):
+    """Later pages of the comment thread, as a fragment for the detail
+    page script or as a page of their own.
+    """
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.is_ajax():
+        template = 'includes/comments.html'
+    else:
+        template = 'posts/post_comments.html'
+    context = {
+        'post_id': post_id,
+        'comments': comment_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, template, context)
+
+
+@require_GET
+def search(request):
+    """Posts whose text or comments match ``?q=``, best match first."""
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'results': search_posts(query) if query else [],
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 @require_http_methods(['GET', 'POST'])
+@transaction.atomic
 def post_create(request):
     template = 'posts/create_post.html'
 
@@ -96,6 +157,7 @@ def post_create(request):
         post.author = request.user
 
         post.save()
+        thumbnails.enqueue(post)
         return redirect('posts:profile', username=request.user.username)
 
     return render(request, template, {'form': form})
@@ -104,10 +166,9 @@ def post_create(request):
 @login_required
 @user_is_author
 @require_http_methods(['GET', 'POST'])
-def post_edit(request, post_id):
+@transaction.atomic
+def post_edit(request, post_id, post):
     template = 'posts/create_post.html'
-    post = get_object_or_404(Post, pk=post_id)
-
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -115,7 +176,9 @@ def post_edit(request, post_id):
     )
 
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id)
 
     context = {
@@ -129,6 +192,7 @@ def post_edit(request, post_id):
 
 @login_required
 @require_http_methods(['GET', 'POST'])
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -142,19 +206,16 @@ def add_comment(request, post_id):
 
 @login_required
 @require_GET
+@replica_reads
 def follow_index(request):
-    user = request.user
-    posts = Post.objects.filter(author__following__user=user)
-
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.page(request, request.user, POSTS_PER_PAGE)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 @require_GET
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     current_user = request.user
@@ -166,6 +227,7 @@ def profile_follow(request, username):
 
 @login_required
 @require_GET
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     current_user = request.user
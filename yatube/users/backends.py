@@ -0,0 +1,39 @@
+"""Authentication backend keeping users in the cache.
+
+AuthenticationMiddleware loads ``request.user`` on every request; this
+backend answers from the cache, so a steady stream of authenticated
+page views costs no user queries. Cached users are keyed on a version
+stamp of the user, which users.signals bumps when the user is saved or
+deleted. A password change therefore ends old sessions: their auth hash
+is checked against the new password. A lookup that read the old row
+while the change was being saved stores it under the old stamp, where
+it is never read again. Users read from a replica, which may not have
+the change yet, are not cached at all.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from core.db.replicas import is_replica
+from core.stamps import bump, get_stamps
+
+
+def _version_key(user_id):
+    return f'users:auth:v:{user_id}'
+
+
+def forget(user_id):
+    bump(_version_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        version_key = _version_key(user_id)
+        version = get_stamps([version_key])[version_key]
+        key = f'users:auth:{user_id}:{version}'
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None and not is_replica(user._state.db):
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
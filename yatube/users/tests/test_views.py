@@ -1,8 +1,16 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls.base import reverse
 from django.test import TestCase, Client
 from django import forms
 
+from ..backends import CachedModelBackend
+
 User = get_user_model()
 
 
@@ -43,3 +51,55 @@ class UsersUrlTests(TestCase):
         """"SignUp view uses correct template."""
         response = self.unreg_client.get(reverse('users:signup'))
         self.assertTemplateUsed(response, 'users/signup.html')
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='Cached', password='1234passs'
+        )
+        self.client.login(username='Cached', password='1234passs')
+
+    def test_page_view_does_not_load_session_or_user(self):
+        """An authenticated page view reads them from the cache."""
+        url = reverse('about:author')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(
+            [
+                query['sql'] for query in queries
+                if 'django_session' in query['sql']
+                or 'FROM "auth_user"' in query['sql']
+            ],
+            [],
+        )
+
+    def test_password_change_ends_cached_sessions(self):
+        """Changing the password drops the cached user."""
+        url = reverse('about:author')
+        self.client.get(url)
+        self.user.set_password('new-1234passs')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_lookup_racing_password_change_is_not_reused(self):
+        """A user read before a password change is not cached as current.
+        """
+        stale = User.objects.get(pk=self.user.pk)
+
+        def read_then_change(backend, user_id):
+            self.user.set_password('new-1234passs')
+            self.user.save()
+            return stale
+
+        with patch.object(ModelBackend, 'get_user', read_then_change):
+            CachedModelBackend().get_user(self.user.pk)
+
+        self.assertEqual(
+            CachedModelBackend().get_user(self.user.pk).password,
+            self.user.password,
+        )
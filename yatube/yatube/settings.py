@@ -65,7 +65,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.db.replicas.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,25 +103,80 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Threads per worker process serving requests under yatube.asgi; each
+# holds its own database connection.
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default=8))
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', default='core.db.backends.postgresql'),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Seconds a connection is kept for later requests; 0 closes it
+        # at the end of every request.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # Ping a kept connection before it serves a new request.
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='true'
+        ).lower() == 'true',
+        # Connections shared by the threads of a worker process; a
+        # SIZE of 0 turns the pool off. Requests wait up to TIMEOUT
+        # seconds for a free connection.
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', default=0)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
+        },
     }
 }
 
+# Read-only views read from a replica when DB_REPLICA_HOST or
+# DB_REPLICA_NAME is set; see core.db.replicas. Visitors stay on the
+# primary for REPLICA_PIN_SECONDS after they wrote, to cover the lag.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(
+            'DB_REPLICA_NAME', default=DATABASES['default']['NAME']
+        ),
+        'HOST': os.getenv(
+            'DB_REPLICA_HOST', default=DATABASES['default']['HOST']
+        ),
+        'PORT': os.getenv(
+            'DB_REPLICA_PORT', default=DATABASES['default']['PORT']
+        ),
+        # Tests read through the primary's test database.
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Sessions are read from the cache and written through to the database.
+# 'django.contrib.sessions.backends.signed_cookies' keeps them in a signed
+# cookie instead, and 'django.contrib.sessions.backends.cache' in the
+# cache alone.
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db'
+)
+
+# request.user comes from the cache. Sessions started under the plain
+# ModelBackend end, and their users log in again once.
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_USER_CACHE_TIMEOUT', default=3600)
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -157,6 +215,14 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# collectstatic writes fingerprinted, precompressed copies; names missing
+# from the manifest fall back to the plain file.
+STATICFILES_STORAGE = 'core.staticfiles.ManifestStorage'
+
+# Serve STATIC_ROOT and MEDIA_ROOT from Django, with long-lived caching.
+# Turn off when a web server in front of the app serves them.
+SERVE_FILES = os.getenv('SERVE_FILES', default='true').lower() == 'true'
+
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -165,8 +231,60 @@ LOGIN_REDIRECT_URL = 'posts:index'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are streamed to disk; bytes past UPLOAD_MAX_SIZE are dropped
+# and the form rejects the file.
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', default=10 * 1024 ** 2))
+
+# Uploaded images are reduced to IMAGE_MAX_DIMENSION pixels per side and
+# re-encoded at IMAGE_QUALITY; images over IMAGE_MAX_PIXELS are refused.
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', default=2048))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', default=50_000_000))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', default=80))
+
+# Per-worker LRU in front of a cache shared by all workers on the box.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')
+        ),
+        'OPTIONS': {
+            'SHARED_BACKEND': os.getenv(
+                'CACHE_SHARED_BACKEND',
+                default='django.core.cache.backends.filebased.FileBasedCache'
+            ),
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+            'LOCAL_MAX_ENTRIES': int(
+                os.getenv('CACHE_LOCAL_MAX_ENTRIES', default=1000)
+            ),
+        },
     }
 }
+
+# Authors with more followers than this are not fanned out on write:
+# their posts are pulled into follow feeds at read time.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=1000))
+# Posts copied into a follow feed when it is built or an author is
+# followed; older pages are read from the posts themselves.
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', default=500))
+
+# Seconds an anonymous feed page stays cached between purges.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = int(
+    os.getenv('ANONYMOUS_PAGE_CACHE_TIMEOUT', default=60)
+)
+
+# Threads per worker process rendering thumbnails of uploaded images.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+
+# PostgreSQL text search configuration of the posts search index.
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+
+# Share of requests profiled into Server-Timing headers and /_perf/,
+# from 0 (off) to 1 (every request).
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0))
+
+# Directory shared by worker processes for /metrics; unset, /metrics
+# reports the serving process only. METRICS_TOKEN guards the endpoint.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
@@ -1,11 +1,13 @@
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 
+from core.views import media_file, performance, prometheus_metrics, static_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('_perf/', performance, name='performance'),
+    path('metrics', prometheus_metrics, name='metrics'),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -18,7 +20,16 @@ handler500 = 'core.views.server_error'
 
 handler403 = 'core.views.permission_denied'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+if settings.SERVE_FILES:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'),
+            static_file,
+            name='static_file',
+        ),
+        re_path(
+            r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'),
+            media_file,
+            name='media_file',
+        ),
+    ]